@@ -1,3 +1,4 @@
+import { useCallback } from 'react';
 import { createApi, fetchBaseQuery } from '@reduxjs/toolkit/query/react';
 import { getBaseUrl, getApiKey } from '../utils/apiUtils';
 
@@ -30,7 +31,51 @@ export const trackingApi = createApi({
         body: { event_type: eventType },
       }),
     }),
+    // Send several queued events in one request
+    trackEvents: builder.mutation({
+      query: (eventTypes: string[]) => ({
+        url: '/track_events',
+        method: 'POST',
+        body: eventTypes.map((eventType) => ({ event_type: eventType })),
+        keepalive: true, // Lets a flush on page hide finish after the page is gone
+      }),
+    }),
   }),
 });
 
-export const { useTrackEventMutation } = trackingApi;
+export const { useTrackEventMutation, useTrackEventsMutation } = trackingApi;
+
+// Events are queued and sent together through trackEvents, a few seconds after the first one
+const FLUSH_DELAY_MS = 5000;
+const MAX_QUEUED_EVENTS = 20;
+
+let queuedEvents: string[] = [];
+let flushTimer: ReturnType<typeof setTimeout> | undefined;
+let sendEvents: ((eventTypes: string[]) => unknown) | undefined;
+
+const flushEvents = () => {
+  clearTimeout(flushTimer);
+  flushTimer = undefined;
+  if (!queuedEvents.length || !sendEvents) return;
+  sendEvents(queuedEvents);
+  queuedEvents = [];
+};
+
+// Send what is still queued before the tab is hidden or closed
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'hidden') flushEvents();
+});
+
+// Same call as useTrackEventMutation's trigger, but the event is queued instead of sent on its own
+export const useTrackEvent = () => {
+  const [trackEvents] = useTrackEventsMutation();
+  return useCallback((eventType: string) => {
+    sendEvents = trackEvents;
+    queuedEvents.push(eventType);
+    if (queuedEvents.length >= MAX_QUEUED_EVENTS) {
+      flushEvents();
+    } else if (!flushTimer) {
+      flushTimer = setTimeout(flushEvents, FLUSH_DELAY_MS);
+    }
+  }, [trackEvents]);
+};
@@ -1,5 +1,5 @@
 import { createApi, fetchBaseQuery } from '@reduxjs/toolkit/query/react';
-import { AQIData } from '../types/aqiData';
+import { AQIData, AggregateBucket, Columnar } from '../types/aqiData';
 import { getBaseUrl, getApiKey  } from '../utils/apiUtils';
 
 export const aqiApi = createApi({
@@ -23,8 +23,50 @@ export const aqiApi = createApi({
         if (end_time) url += `&end_time=${end_time}`;
         return url;
       },
+      // Prepend readings pushed by /live instead of re-fetching the whole list
+      async onCacheEntryAdded({ limit = 100, end_time }, { updateCachedData, cacheDataLoaded, cacheEntryRemoved }) {
+        if (end_time) return; // A window that has ended gets no new readings
+        const source = new EventSource(`${getBaseUrl()}/live?tables=aqi_data`);
+        try {
+          await cacheDataLoaded;
+          source.addEventListener('aqi_data', (event) => {
+            const reading: AQIData = JSON.parse((event as MessageEvent).data);
+            updateCachedData((draft) => {
+              // Timestamps are unique; a reconnect can push a reading the list already holds
+              if (draft.some((row) => row.timestamp === reading.timestamp)) return;
+              // Keep the list newest first when a late reading arrives out of order
+              const index = draft.findIndex((row) => row.timestamp < reading.timestamp);
+              draft.splice(index === -1 ? draft.length : index, 0, reading);
+              draft.splice(limit);
+            });
+          });
+        } catch {
+          // The entry was removed before its first load finished
+        }
+        await cacheEntryRemoved;
+        source.close();
+      },
+    }),
+    // Same rows as getAQIData, one array per field (about half the payload)
+    getAQIDataColumnar: builder.query<Columnar<AQIData>, { limit?: number; start_time?: string; end_time?: string }>({
+      query: ({ limit = 100, start_time, end_time }) => {
+        let url = `/aqi_data?limit=${limit}&format=columnar`;
+        if (start_time) url += `&start_time=${start_time}`;
+        if (end_time) url += `&end_time=${end_time}`;
+        return url;
+      },
+    }),
+    // Per-bucket series computed by the backend, e.g. bucket=1h&agg=avg,max
+    getAQIAggregate: builder.query<AggregateBucket[], { bucket?: string; agg?: string; fields?: string; start_time?: string; end_time?: string }>({
+      query: ({ bucket = '1h', agg = 'avg', fields, start_time, end_time }) => {
+        let url = `/aqi_data/aggregate?bucket=${bucket}&agg=${agg}`;
+        if (fields) url += `&fields=${fields}`;
+        if (start_time) url += `&start_time=${start_time}`;
+        if (end_time) url += `&end_time=${end_time}`;
+        return url;
+      },
     }),
   }),
 });
 
-export const { useGetAQIDataQuery } = aqiApi;
+export const { useGetAQIDataQuery, useGetAQIDataColumnarQuery, useGetAQIAggregateQuery } = aqiApi;
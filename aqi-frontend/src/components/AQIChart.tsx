@@ -7,7 +7,7 @@ import { AQIData, ZPHS01BData } from '../types/aqiData';
 import AQIContent from './AQIContent';
 import MobileAQIContent from './MobileAQIContent';
 import AQITrendReportModal from './AQITrendReportModal';
-import { useTrackEventMutation } from '../api/api-tracking';
+import { useTrackEvent } from '../api/api-tracking';
 // import WindRoseComponent from './WeatherIndicatorCard'; // Import the new component
 import './AQIChart.css';  // Add custom CSS for responsive styling
 
@@ -79,13 +79,13 @@ const AQIChart: React.FC = () => {
     const [dataPoints, setDataPoints] = useState(5000);
     const [timeRange, setTimeRange] = useState(48);
     const [drawerVisible, setDrawerVisible] = useState(false);
-    const [trackEvent] = useTrackEventMutation();
+    const trackEvent = useTrackEvent();
     const [isLoadingRefresh, setIsLoadingRefresh] = useState(false); // Loading state for refresh
 
 
     const toggleDrawer = async () => {
          setDrawerVisible(!drawerVisible);
-         await trackEvent("open_search_and_setting_button_clicked");
+         trackEvent("open_search_and_setting_button_clicked");
     }
 
     const { data = [], error, isLoading, refetch } = useGetAQIDataQuery({ limit: dataPoints });
@@ -101,10 +101,10 @@ const AQIChart: React.FC = () => {
         if (isMobile) { 
             setShowBanner(true);
             // Send tracking event when button is clicked
-            await trackEvent("export_data_as_csv_denied");
+            trackEvent("export_data_as_csv_denied");
         } else { 
             exportToCSV(filteredData); 
-            await trackEvent("export_data_as_csv_allowed");
+            trackEvent("export_data_as_csv_allowed");
         }
     };
 
@@ -48,7 +48,7 @@ const AQIContent: React.FC<AQIContentProps> = ({ data, zpsh01b_data }) => {
             </div>
 
             {/* <div style={{ width: '90%', margin: '20px auto' }}>
-                <OverallAQIChart data={data} />
+                <OverallAQIChart />
             </div> */}
             {/* <div style={{ width: '90%', margin: '20px auto' }}>
                 <PM25Chart data={data} />
@@ -1,7 +1,7 @@
 import React, { useEffect, useRef, useState } from 'react';
 import { Card, Typography, Descriptions, Statistic, Row, Col, List, Alert } from 'antd';
 import { AQIData } from '../types/aqiData';
-import { useTrackEventMutation } from '../api/api-tracking';
+import { useTrackEvent } from '../api/api-tracking';
 import { useGetZPHS01BDataQuery } from '../api/api-zphs01bApi'; // Import the VOC API hook
 import './AQITrendMessage.css';
 
@@ -22,7 +22,7 @@ const calculateSlope = (data: AQIData[]) => {
 };
 
 const AQITrendMessage: React.FC<AQITrendMessageProps> = ({ data }) => {
-    const [trackEvent] = useTrackEventMutation();
+    const trackEvent = useTrackEvent();
     const containerRef = useRef<HTMLDivElement>(null);
     const [hasScrolled, setHasScrolled] = useState(false);
 
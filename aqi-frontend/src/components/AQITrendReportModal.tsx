@@ -3,7 +3,7 @@ import React, { useState } from 'react';
 import { Button, Modal } from 'antd';
 import AQITrendMessage from './AQITrendMessage';
 import { AQIData } from '../types/aqiData';
-import { useTrackEventMutation } from '../api/api-tracking';
+import { useTrackEvent } from '../api/api-tracking';
 import "./AQITrendReportModal.css"
 
 interface AQITrendReportProps {
@@ -12,12 +12,12 @@ interface AQITrendReportProps {
 
 const AQITrendReportModal: React.FC<AQITrendReportProps> = ({ data }) => {
     const [isModalVisible, setIsModalVisible] = useState(false);
-    const [trackEvent] = useTrackEventMutation();
+    const trackEvent = useTrackEvent();
 
     const showModal = async () => {
         setIsModalVisible(true);
         // Send tracking event when button is clicked
-        await trackEvent("view_aqi_trend_report");
+        trackEvent("view_aqi_trend_report");
     };
 
     const handleCancel = () => {
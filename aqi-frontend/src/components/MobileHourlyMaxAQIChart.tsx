@@ -3,7 +3,8 @@ import { Line } from 'react-chartjs-2';
 import { Chart as ChartJS, registerables } from 'chart.js';
 import zoomPlugin from 'chartjs-plugin-zoom';
 import { Button } from 'antd';
-import { AQIData } from '../types/aqiData';
+import { AQIData, AggregateBucket } from '../types/aqiData';
+import { useGetAQIAggregateQuery } from '../api/api';
 import { formatTimestamp } from '../utils/dateUtils';
 import './MobileHourly.css';
 import { ChartJSOrUndefined } from 'react-chartjs-2/dist/types';
@@ -34,29 +35,14 @@ const getHourlyMaxData = (data: AQIData[]) => {
     }));
 };
 
-const getHalfHourlyAverageData = (data: AQIData[]) => {
-    const halfHourlyData: { [halfHour: string]: { totalAQI: number, count: number } } = {};
-
-    data.forEach((item) => {
-        const timestamp = new Date(item.timestamp);
-        const hour = timestamp.getHours();
-        const minutes = timestamp.getMinutes();
-        const halfHourSegment = minutes < 30 ? "00" : "30";
-        const date = timestamp.toDateString();
-        const key = `${date} ${hour}:${halfHourSegment}`;
-        const avgAQI = Math.max(item.aqi_pm25, item.aqi_pm10);
-        if (!halfHourlyData[key]) {
-            halfHourlyData[key] = { totalAQI: 0, count: 0 };
-        }
-
-        halfHourlyData[key].totalAQI += avgAQI;
-        halfHourlyData[key].count += 1;
-    });
-
-    return Object.keys(halfHourlyData).map((key) => ({
-        time: key,
-        aqi: halfHourlyData[key].totalAQI / halfHourlyData[key].count,
-    }));
+// overall_aqi is the higher of the PM2.5 and PM10 AQI, so its bucket average is the average of that maximum
+const getHourlyAverageData = (buckets: AggregateBucket[]) => {
+    return buckets
+        .filter((bucket) => bucket.values.overall_aqi?.avg != null)
+        .map((bucket) => ({
+            time: bucket.bucket,
+            aqi: bucket.values.overall_aqi.avg as number,
+        }));
 };
 
 
@@ -70,8 +56,16 @@ const getLastFiveEntries = (data: AQIData[]) => {
 const MobileHourlyMaxAQIChart: React.FC<Props> = ({ data }) => {
     const chartRef = React.useRef<ChartJSOrUndefined<'line'>>(null);
 
-    // Get both hourly max data and latest five entries
-    const historicalData = getHalfHourlyAverageData(data);
+    // Hourly averages come from the backend, from the hour of the oldest reading shown onwards;
+    // truncating to the hour keeps the query unchanged as new readings arrive
+    const start_time = data.length ? `${data[0].timestamp.slice(0, 13)}:00:00` : undefined;
+    const { data: buckets = [] } = useGetAQIAggregateQuery(
+        { bucket: '1h', agg: 'avg', fields: 'overall_aqi', start_time },
+        { skip: !start_time },
+    );
+
+    // Get both hourly average data and latest five entries
+    const historicalData = getHourlyAverageData(buckets);
     const latestData = getLastFiveEntries(data);
 
     // Merge the time labels and AQI values
@@ -88,7 +82,7 @@ const MobileHourlyMaxAQIChart: React.FC<Props> = ({ data }) => {
         labels: combinedLabels,
         datasets: [
             {
-                label: 'Half Hourly Average AQI Data',
+                label: 'Hourly Average AQI Data',
                 data: combinedData,
                 fill: false,
                 borderColor: 'rgba(75,192,192,1)',
@@ -157,7 +151,7 @@ const MobileHourlyMaxAQIChart: React.FC<Props> = ({ data }) => {
 
     return (
         <div style={{ padding: '20px', maxWidth: '100%' }}>
-            <h3>Half Hourly Average AQI Data</h3>
+            <h3>Hourly Average AQI Data</h3>
             <div style={{ position: 'relative', height: '400px' }}>
                 <Line ref={chartRef} data={chartData} options={options} />
             </div>
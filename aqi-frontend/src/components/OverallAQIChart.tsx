@@ -1,20 +1,28 @@
 import React from 'react';
 import { Line } from 'react-chartjs-2';
-import { AQIData } from '../types/aqiData';
+import { useGetAQIAggregateQuery } from '../api/api';
 import '../chartConfig'; 
 import { formatTimestamp } from '../utils/dateUtils';
 
 interface Props {
-    data: AQIData[];
+    // Without a start time the backend returns the last day up to the newest reading
+    start_time?: string;
+    end_time?: string;
 }
 
-const OverallAQIChart: React.FC<Props> = ({ data }) => {
+const OverallAQIChart: React.FC<Props> = ({ start_time, end_time }) => {
+    // 5-minute averages computed by the backend instead of every raw reading
+    const { data: buckets = [] } = useGetAQIAggregateQuery({
+        bucket: '5m', agg: 'avg', fields: 'aqi_pm25,aqi_pm10', start_time, end_time,
+    });
+    const data = buckets.filter((bucket) => bucket.values.aqi_pm25?.avg != null && bucket.values.aqi_pm10?.avg != null);
+
     const chartData = {
-        labels: data.map((item) => formatTimestamp(item.timestamp)),
+        labels: data.map((bucket) => formatTimestamp(bucket.bucket)),
         datasets: [
             {
                 label: 'Overall AQI',
-                data: data.map((item) => (item.aqi_pm25 + item.aqi_pm10) / 2),
+                data: data.map((bucket) => ((bucket.values.aqi_pm25.avg as number) + (bucket.values.aqi_pm10.avg as number)) / 2),
                 fill: false,
                 borderColor: 'rgba(255,99,132,1)',
                 tension: 0.1
@@ -5,6 +5,12 @@ export interface AQIData {
     pm25: number;
     pm10: number;
     overall_aqi: number;
+    // Window min/max and number of readings averaged, when the collector samples continuously
+    pm25_min: number | null;
+    pm25_max: number | null;
+    pm10_min: number | null;
+    pm10_max: number | null;
+    sample_count: number | null;
 }
 
 
@@ -27,6 +33,17 @@ export interface ZPHS01BData {
     aqi_o3: number;
     aqi_no2: number;
     overall_aqi: number;
+    pm1_0_min: number | null;
+    pm1_0_max: number | null;
+    pm2_5_min: number | null;
+    pm2_5_max: number | null;
+    pm10_min: number | null;
+    pm10_max: number | null;
+    co2_min: number | null;
+    co2_max: number | null;
+    voc_min: number | null;
+    voc_max: number | null;
+    sample_count: number | null;
   }
   
 
@@ -41,4 +58,13 @@ export interface WeatherData {
   rain_accumulation: number; // Rain accumulation in mm (optional)
   city_name: string; // City name (optional)
   locality_name: string; // Locality name (optional)
-}
\ No newline at end of file
+}
+
+export interface AggregateBucket {
+  bucket: string; // ISO timestamp of the bucket start
+  count: number; // Number of raw readings in the bucket
+  values: { [field: string]: { [agg: string]: number | null } }; // e.g. values.pm25.avg
+}
+
+// Response of the reading endpoints with format=columnar: one array per field, aligned by index
+export type Columnar<T> = { [K in keyof T]: T[K][] };
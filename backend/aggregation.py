@@ -0,0 +1,204 @@
+# aggregation.py
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import (
+    AQIReading, ZPHS01BReading, WeatherData,
+    AQIReadingRollup1m, AQIReadingRollup1h, AQIReadingRollup1d,
+    ZPHS01BReadingRollup1m, ZPHS01BReadingRollup1h, ZPHS01BReadingRollup1d,
+)
+from queries import apply_time_range, fetch_latest_timestamp, naive_utc
+
+logger = logging.getLogger(__name__)
+
+# Supported bucket sizes, in seconds
+BUCKETS = {
+    "1m": 60,
+    "5m": 5 * 60,
+    "1h": 60 * 60,
+    "1d": 24 * 60 * 60,
+}
+
+# Window returned when the caller does not pass start_time, per bucket size
+DEFAULT_WINDOWS = {
+    "1m": timedelta(hours=6),
+    "5m": timedelta(days=1),
+    "1h": timedelta(days=7),
+    "1d": timedelta(days=90),
+}
+
+# Refuse requests that would return more buckets than a chart can use
+MAX_BUCKETS = 10000
+
+# Aggregate functions that can be requested with `agg=`
+AGGREGATES = {
+    "avg": lambda column: func.avg(column),
+    "min": lambda column: func.min(column),
+    "max": lambda column: func.max(column),
+    "p95": lambda column: func.percentile_cont(0.95).within_group(column),
+}
+
+# Numeric columns that can be aggregated, per model
+AGGREGATE_FIELDS = {
+    AQIReading: ["pm25", "pm10", "aqi_pm25", "aqi_pm10", "overall_aqi"],
+    ZPHS01BReading: [
+        "pm1_0", "pm2_5", "pm10", "co2", "voc", "temperature", "humidity",
+        "ch2o", "co", "o3", "no2", "overall_aqi",
+    ],
+    WeatherData: [
+        "temperature", "humidity", "wind_speed", "wind_direction",
+        "rain_intensity", "rain_accumulation",
+    ],
+}
+
+# Rollup tables maintained by the collector, keyed by their bucket size in seconds
+ROLLUPS = {
+    AQIReading: {60: AQIReadingRollup1m, 3600: AQIReadingRollup1h, 86400: AQIReadingRollup1d},
+    ZPHS01BReading: {60: ZPHS01BReadingRollup1m, 3600: ZPHS01BReadingRollup1h, 86400: ZPHS01BReadingRollup1d},
+}
+
+# Aggregates that can be answered from rollups; percentiles need the raw rows
+ROLLUP_AGGREGATES = {"avg", "min", "max"}
+
+# Set AGGREGATE_SOURCE=raw to always aggregate the raw reading tables
+use_rollups = os.getenv("AGGREGATE_SOURCE", "rollup") == "rollup"
+
+# When the rollup tables are missing, aggregate raw rows for this many seconds before trying them again
+ROLLUP_RETRY_SECONDS = 300
+
+# SQLSTATE of "relation does not exist"
+UNDEFINED_TABLE = "42P01"
+
+_rollups_missing_until = 0.0
+
+
+def parse_list(value: Optional[str], allowed, name: str) -> List[str]:
+    """Split a comma-separated query parameter and validate every item against `allowed`."""
+    items = [item.strip() for item in value.split(",") if item.strip()] if value else []
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise ValueError(f"Unsupported {name}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return items
+
+
+def bucket_expression(column, seconds: int):
+    """Floor a timestamp column to the start of its bucket, keeping it a naive timestamp."""
+    epoch = func.floor(func.extract("epoch", column) / seconds) * seconds
+    return func.timezone("UTC", func.to_timestamp(epoch))
+
+
+async def resolve_window(db: AsyncSession, model, bucket: str, start_time: Optional[datetime], end_time: Optional[datetime]):
+    """
+    Fill in a missing start_time from the bucket's default window.
+
+    The window is anchored at end_time, or at the newest reading when end_time is not given, so
+    it does not depend on the clock or timezone of the API host.
+    """
+    anchor = end_time or naive_utc(await fetch_latest_timestamp(db, model))
+    if anchor is None:
+        return start_time, end_time  # Empty table, nothing to bound
+
+    if start_time is None:
+        start_time = anchor - DEFAULT_WINDOWS[bucket]
+
+    if (anchor - start_time).total_seconds() / BUCKETS[bucket] > MAX_BUCKETS:
+        raise ValueError(f"Requested range spans more than {MAX_BUCKETS} buckets of {bucket}")
+    return start_time, end_time
+
+
+def pick_rollup(model, bucket: str, aggs: List[str], fields: List[str]):
+    """Return the coarsest rollup model whose buckets evenly divide `bucket`, or None to use raw rows."""
+    if not use_rollups or time.monotonic() < _rollups_missing_until or not set(aggs) <= ROLLUP_AGGREGATES:
+        return None
+    candidates = [
+        size for size, rollup in ROLLUPS.get(model, {}).items()
+        if BUCKETS[bucket] % size == 0 and all(hasattr(rollup, f"{field}_sum") for field in fields)
+    ]
+    return ROLLUPS[model][max(candidates)] if candidates else None
+
+
+def raw_statement(model, bucket: str, aggs: List[str], fields: List[str], start_time, end_time):
+    """Aggregate the raw reading rows of `model`."""
+    bucket_col = bucket_expression(model.timestamp, BUCKETS[bucket]).label("bucket")
+    columns = [bucket_col, func.count().label("count")]
+    for field in fields:
+        for agg in aggs:
+            column = getattr(model, field)
+            if agg in ("min", "max") and hasattr(model, f"{field}_{agg}"):
+                # Rows averaged over a window keep its extremes, like the rollups do
+                column = func.coalesce(getattr(model, f"{field}_{agg}"), column)
+            columns.append(cast(AGGREGATES[agg](column), Float).label(f"{field}__{agg}"))
+
+    stmt = select(*columns).group_by(bucket_col).order_by(bucket_col)
+    return apply_time_range(stmt, model, start_time, end_time)
+
+
+def rollup_statement(rollup, bucket: str, aggs: List[str], fields: List[str], start_time, end_time):
+    """
+    Re-aggregate a rollup table into `bucket`-sized buckets.
+
+    Rollup rows are selected by bucket start, so the first and last bucket may include readings
+    just outside start_time/end_time.
+    """
+    bucket_col = bucket_expression(rollup.bucket, BUCKETS[bucket]).label("bucket")
+    columns = [bucket_col, func.sum(rollup.sample_count).label("count")]
+    for field in fields:
+        for agg in aggs:
+            if agg == "avg":
+                value = func.sum(getattr(rollup, f"{field}_sum")) / func.sum(rollup.sample_count)
+            elif agg == "min":
+                value = func.min(getattr(rollup, f"{field}_min"))
+            else:
+                value = func.max(getattr(rollup, f"{field}_max"))
+            columns.append(cast(value, Float).label(f"{field}__{agg}"))
+
+    stmt = select(*columns).group_by(bucket_col).order_by(bucket_col)
+    if start_time:
+        stmt = stmt.where(rollup.bucket >= start_time)
+    if end_time:
+        stmt = stmt.where(rollup.bucket <= end_time)
+    return stmt
+
+
+async def aggregate_readings(
+    db: AsyncSession,
+    model,
+    bucket: str,
+    aggs: List[str],
+    fields: List[str],
+    start_time: Optional[datetime],
+    end_time: Optional[datetime],
+) -> List[Dict]:
+    """Return one row per bucket with the requested aggregates computed in the database."""
+    global _rollups_missing_until
+    start_time, end_time = await resolve_window(db, model, bucket, naive_utc(start_time), naive_utc(end_time))
+
+    rows = None
+    rollup = pick_rollup(model, bucket, aggs, fields)
+    if rollup is not None:
+        try:
+            rows = (await db.execute(rollup_statement(rollup, bucket, aggs, fields, start_time, end_time))).all()
+        except ProgrammingError as e:
+            if getattr(e.orig, "sqlstate", None) != UNDEFINED_TABLE:
+                raise
+            # The rollup migration has not been applied to this database (yet)
+            await db.rollback()
+            _rollups_missing_until = time.monotonic() + ROLLUP_RETRY_SECONDS
+            logger.warning(f"Rollup tables unavailable, aggregating raw readings for {ROLLUP_RETRY_SECONDS}s: {e.orig}")
+
+    if rows is None:
+        rows = (await db.execute(raw_statement(model, bucket, aggs, fields, start_time, end_time))).all()
+
+    return [
+        {
+            "bucket": row.bucket,
+            "count": row.count,
+            "values": {field: {agg: row._mapping[f"{field}__{agg}"] for agg in aggs} for field in fields},
+        }
+        for row in rows
+    ]
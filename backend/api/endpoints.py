@@ -1,13 +1,29 @@
+import asyncio
 import logging
-from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from db import get_db
-from models import AQIReading, TrackingEvent, ZPHS01BReading, WeatherData
-from schemas import AQIReadingResponse, TrackingEventRequest, ZPHS01BReadingResponse, WeatherDataResponse
-from typing import List, Optional
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from db import AsyncSessionLocal, get_async_db
+from models import AQIReading, ZPHS01BReading, WeatherData
+from schemas import AQIReadingResponse, TrackingEventRequest, ZPHS01BReadingResponse, WeatherDataResponse, AggregateBucketResponse
+from typing import List, Literal, Optional
 from datetime import datetime
 from cache_manager import cache_manager
+from aggregation import AGGREGATES, AGGREGATE_FIELDS, aggregate_readings, parse_list
+from pagination import CURSOR_HEADER, apply_cursor, decode_cursor, encode_cursor, next_cursor
+from queries import apply_time_range, schema_columns
+from serialization import MEDIA_TYPES, FormatUnavailable, csv_chunk, dumps_rows, ndjson_chunk, negotiate, serialize_columns, to_columns
+from batch_writer import tracking_event_writer
+from live_feed import live_feed
+from conditional import LIVE_MAX_AGE, not_modified, validators
+from compression import MIN_BYTES as COMPRESSION_MIN_BYTES, choose_encoding, compress
+import metrics
+import profiling
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -15,161 +31,378 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _validate_cursor(cursor: Optional[str]):
+    """Reject malformed pagination cursors with a 400 before touching the database."""
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+async def _load_readings(db: AsyncSession, model, schema, not_found: str, fmt: str, limit, offset, cursor, start_time, end_time) -> cache_manager.CachedResponse:
+    """Query one page of readings and serialize it in `fmt`, with the next-page cursor as a header."""
+    headers = {"Content-Type": MEDIA_TYPES[fmt], "Vary": "Accept"}
+
+    # The newest pages are served from the recent-readings ring buffer when it covers them
+    if not cursor and not offset and limit:
+        recent = await cache_manager.read_recent(model.__tablename__, limit, start_time, end_time)
+        if recent:
+            return _recent_response(recent, schema, fmt, limit, headers)
+
+    # Plain column tuples, serialized straight from the rows (no ORM objects or Pydantic validation)
+    fields = list(schema.model_fields)
+    query = select(*schema_columns(model, schema), model.id)
+    query = apply_cursor(query, model, cursor)
+    query = apply_time_range(query, model, start_time, end_time)
+    query = query.offset(offset)
+    if limit:
+        query = query.limit(limit)
+    rows = (await db.execute(query)).all()
+    metrics.observe("db_rows_returned", len(rows), buckets=metrics.ROW_BUCKETS, table=model.__tablename__)
+
+    if not rows:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    cursor_value = next_cursor(rows, limit)
+    if cursor_value:
+        headers[CURSOR_HEADER] = cursor_value
+
+    with metrics.timed("serialization_seconds", format=fmt, source="database"), profiling.span("serialize"):
+        if fmt != "json":
+            body = _encode_columns(rows, schema, fmt)
+        else:
+            body = dumps_rows(fields, rows)
+    return cache_manager.CachedResponse(body=body, headers=headers)
+
+def _recent_response(recent, schema, fmt: str, limit, headers) -> cache_manager.CachedResponse:
+    """Build a response from pre-serialized ring buffer rows; JSON rows are joined without re-encoding."""
+    if len(recent) == limit:
+        last_id, last_row = recent[-1]
+        headers[CURSOR_HEADER] = encode_cursor(datetime.fromisoformat(orjson.loads(last_row)["timestamp"]), last_id)
+    with metrics.timed("serialization_seconds", format=fmt, source="recent"), profiling.span("serialize"):
+        if fmt != "json":
+            body = _encode_columns([orjson.loads(row) for _, row in recent], schema, fmt)
+        else:
+            body = b"[" + b",".join(row for _, row in recent) + b"]"
+    return cache_manager.CachedResponse(body=body, headers=headers)
+
+def _encode_columns(rows, schema, fmt: str) -> bytes:
+    try:
+        return serialize_columns(to_columns(rows, list(schema.model_fields)), fmt)
+    except FormatUnavailable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+async def _compressed(entry: cache_manager.CachedResponse, encoding: Optional[str]) -> cache_manager.CachedResponse:
+    """Compress a freshly loaded response body if the client accepts it and it is big enough."""
+    if not encoding or len(entry.body) < COMPRESSION_MIN_BYTES:
+        return entry
+    # Compressing a large page takes milliseconds; keep it off the event loop
+    with metrics.timed("compression_seconds", encoding=encoding), profiling.span("compress"):
+        body = await run_in_threadpool(compress, entry.body, encoding)
+    return cache_manager.CachedResponse(body=body, headers={**entry.headers, "Content-Encoding": encoding})
+
+async def _serve_cached(request: Request, db: AsyncSession, model, name: str, params: dict, ttl: int, loader) -> Response:
+    """
+    Serve a response through the read-through cache, mapping failures to a 500.
+
+    The newest timestamp of the table (one indexed max()) versions both the cache key and the
+    ETag, so a poll that finds nothing new is answered with a bodiless 304.
+    """
+    table = model.__tablename__
+    # Each content coding is its own cache entry (and ETag), so hot responses are compressed once
+    encoding = choose_encoding(request.headers.get("accept-encoding"))
+    if encoding:
+        params = {**params, "encoding": encoding}
+    try:
+        latest = await cache_manager.refresh_latest(db, model)
+        etag = cache_manager.etag(table, params)
+        max_age = cache_manager.HISTORICAL_TTL if cache_manager.is_historical(table, params) else LIVE_MAX_AGE
+        headers = {**validators(etag, latest, max_age), "Vary": "Accept, Accept-Encoding"}
+        if not_modified(request, etag, latest):
+            metrics.increment("http_not_modified_total", table=table)
+            return Response(status_code=304, headers=headers)
+
+        async def load():
+            return await _compressed(await loader(), encoding)
+
+        entry = await cache_manager.read_through(table, params, ttl, load)
+        return Response(content=entry.body, media_type="application/json", headers={**entry.headers, **headers})
+    except HTTPException:
+        raise
+    except PoolTimeoutError:
+        # Every pooled connection stayed busy for DB_POOL_TIMEOUT; shed load instead of queueing
+        metrics.increment("db_pool_timeouts_total")
+        logger.warning(f"No database connection available for {name} data")
+        raise HTTPException(status_code=503, detail="Database busy, retry later", headers={"Retry-After": "1"})
+    except Exception as e:
+        # Log error and return a readable response
+        logger.error(f"Error fetching {name} data: {e}")
+        raise HTTPException(status_code=500, detail="Internal server error")
+
 @router.get("/aqi_data", response_model=List[AQIReadingResponse])
-def get_aqi_data(
+async def get_aqi_data(
+    request: Request,
     limit: int = Query(100, gt=0, le=20000),  # Limit between 1 and 20,000
     offset: int = Query(0, ge=0),  # Offset for pagination
+    cursor: Optional[str] = Query(None),  # Value of X-Next-Cursor from the previous page
     start_time: Optional[datetime] = Query(None),
     end_time: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db)
+    format: Optional[Literal["json", "columnar", "arrow", "msgpack"]] = Query(None),  # Overrides the Accept header
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    try:
-        # Cap the limit to a maximum of 10,000
-        if limit > 10000:
-            limit = 10000
-
-        # Try to get data from cache
-        # cached_data = cache_manager.get_cached_data(cache_manager.AQI_CACHE_KEY)
-        # if cached_data:
-        #     # Log that data is being served from the cache
-        #     logger.info("Serving AQI data from cache")
-        #     # Slice the cached data to serve the requested limit and offset
-        #     return cached_data[offset:offset + limit]
-
-        # Log that data is being fetched from the database
-        logger.info("Cache miss - querying database for AQI data")
-
-        # If cache is not available, fall back to querying the database
-        query = db.query(AQIReading).order_by(AQIReading.timestamp.desc())
-
-        # Apply time range filters
-        if start_time and end_time:
-            query = query.filter(and_(AQIReading.timestamp >= start_time, AQIReading.timestamp <= end_time))
-        elif start_time:
-            query = query.filter(AQIReading.timestamp >= start_time)
-        elif end_time:
-            query = query.filter(AQIReading.timestamp <= end_time)
-
-        # Apply limit and offset
-        query = query.offset(offset).limit(limit)
-        data = query.all()
-
-        if not data:
-            raise HTTPException(status_code=404, detail="No AQI readings found")
-
-        # Update the cache with the fetched data
-        logger.info(f"Updating cache {cache_manager.AQI_CACHE_KEY}")
-        # cache_manager.update_cache(cache_manager.AQI_CACHE_KEY, data)
-        logger.info("Updated AQI data cache after database query")
-
-        return data
-    except Exception as e:
-        # Log error and return a readable response
-        logger.error(f"Error fetching AQI data: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    _validate_cursor(cursor)
+    fmt = negotiate(format, accept)
+    # Cap the limit to a maximum of 10,000
+    limit = min(limit, 10000)
+    params = {"limit": limit, "offset": offset, "cursor": cursor, "start_time": start_time, "end_time": end_time, "format": fmt}
+
+    async def load():
+        logger.debug("Cache miss - querying database for AQI data")
+        return await _load_readings(db, AQIReading, AQIReadingResponse, "No AQI readings found", fmt,
+                              limit, offset, cursor, start_time, end_time)
+
+    return await _serve_cached(request, db, AQIReading, "AQI", params, cache_manager.READING_TTL, load)
+
+
+# Maximum number of events accepted by one /track_events call
+MAX_EVENTS_PER_BATCH = 500
+
+def _queue_tracking_event(event: TrackingEventRequest, request: Request) -> bool:
+    """Hand one event to the write-behind buffer. Returns False if the buffer is full."""
+    # Use the IP from the request if not provided in the payload
+    ip_address = event.ip_address or request.headers.get("X-Forwarded-For", request.client.host).split(",")[0].strip()
+
+    return tracking_event_writer.add({
+        "event_type": event.event_type,
+        "timestamp": datetime.utcnow(),
+        "ip_address": ip_address,
+        "details": event.details,
+    })
 
 
 @router.post("/track_event")
-async def track_event(event: TrackingEventRequest, request: Request, db: Session = Depends(get_db)):
-    try:
-        # Use the IP from the request if not provided in the payload
-        ip_address = event.ip_address or request.headers.get("X-Forwarded-For", request.client.host).split(",")[0].strip()
-
-        tracking_event = TrackingEvent(
-            event_type=event.event_type,
-            timestamp=datetime.utcnow(),
-            ip_address=ip_address,
-            details=event.details
-        )
-
-        db.add(tracking_event)
-        db.commit()
-        logger.info(f"Tracked event: {event.event_type} from IP {ip_address}")
-        return {"message": "Event tracked successfully"}
-    except Exception as e:
-        logger.error(f"Error tracking event: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+async def track_event(event: TrackingEventRequest, request: Request):
+    if not _queue_tracking_event(event, request):
+        logger.warning(f"Dropped tracking event {event.event_type}: buffer full")
+        raise HTTPException(status_code=503, detail="Event buffer full, retry later")
+    return {"message": "Event tracked successfully"}
+
+
+@router.post("/track_events")
+async def track_events(events: List[TrackingEventRequest], request: Request):
+    if len(events) > MAX_EVENTS_PER_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_EVENTS_PER_BATCH} events per request")
+
+    accepted = sum(_queue_tracking_event(event, request) for event in events)
+    dropped = len(events) - accepted
+    if dropped:
+        logger.warning(f"Dropped {dropped} of {len(events)} tracking events: buffer full")
+    if events and not accepted:
+        raise HTTPException(status_code=503, detail="Event buffer full, retry later")
+    return {"message": "Events tracked successfully", "accepted": accepted, "dropped": dropped}
 
 
 @router.get("/zphs01b_data", response_model=List[ZPHS01BReadingResponse])
-def get_zphs01b_data(
+async def get_zphs01b_data(
+    request: Request,
     limit: Optional[int] = Query(None, gt=0, le=20000),  # No default limit
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),  # Value of X-Next-Cursor from the previous page
     start_time: Optional[datetime] = Query(None),
     end_time: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db)
+    format: Optional[Literal["json", "columnar", "arrow", "msgpack"]] = Query(None),  # Overrides the Accept header
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    try:
-        limit = 10000
-        # Log that data is being fetched from the database
-        logger.info("Cache miss - querying database for ZPHS01B data")
-
-        # Query to fetch data from the database
-        query = db.query(ZPHS01BReading).order_by(ZPHS01BReading.timestamp.desc())
-
-        # Apply time range filters
-        if start_time and end_time:
-            query = query.filter(and_(ZPHS01BReading.timestamp >= start_time, ZPHS01BReading.timestamp <= end_time))
-        elif start_time:
-            query = query.filter(ZPHS01BReading.timestamp >= start_time)
-        elif end_time:
-            query = query.filter(ZPHS01BReading.timestamp <= end_time)
-
-        # Apply limit and offset only if limit is provided
-        if limit:
-            query = query.offset(offset).limit(limit)
-        else:
-            query = query.offset(offset)  # Apply only offset if limit is not specified
-
-        data = query.all()
-
-        if not data:
-            raise HTTPException(status_code=404, detail="No ZPHS01B readings found")
+    _validate_cursor(cursor)
+    fmt = negotiate(format, accept)
+    limit = 10000
+    params = {"limit": limit, "offset": offset, "cursor": cursor, "start_time": start_time, "end_time": end_time, "format": fmt}
 
-        # Update the cache with the fetched data
-        logger.info(f"Updating cache {cache_manager.ZPHS01B_CACHE_KEY}")
-        # cache_manager.update_cache(cache_manager.ZPHS01B_CACHE_KEY, data)
-        logger.info("Updated ZPHS01B data cache after database query")
+    async def load():
+        logger.debug("Cache miss - querying database for ZPHS01B data")
+        return await _load_readings(db, ZPHS01BReading, ZPHS01BReadingResponse, "No ZPHS01B readings found", fmt,
+                              limit, offset, cursor, start_time, end_time)
 
-        return data
-    except Exception as e:
-        # Log error and return a readable response
-        logger.error(f"Error fetching ZPHS01B data: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    return await _serve_cached(request, db, ZPHS01BReading, "ZPHS01B", params, cache_manager.READING_TTL, load)
 
 @router.get("/weather_data", response_model=List[WeatherDataResponse])
-def get_weather_data(
+async def get_weather_data(
+    request: Request,
     limit: int = Query(100, gt=0, le=20000),  # Limit between 1 and 20,000
     offset: int = Query(0, ge=0),  # Offset for pagination
+    cursor: Optional[str] = Query(None),  # Value of X-Next-Cursor from the previous page
     start_time: Optional[datetime] = Query(None),
     end_time: Optional[datetime] = Query(None),
-    db: Session = Depends(get_db)
+    format: Optional[Literal["json", "columnar", "arrow", "msgpack"]] = Query(None),  # Overrides the Accept header
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
+    _validate_cursor(cursor)
+    fmt = negotiate(format, accept)
+    # Cap the limit to a maximum of 10,000
+    limit = min(limit, 10000)
+    params = {"limit": limit, "offset": offset, "cursor": cursor, "start_time": start_time, "end_time": end_time, "format": fmt}
+
+    async def load():
+        return await _load_readings(db, WeatherData, WeatherDataResponse, "No weather data found", fmt,
+                              limit, offset, cursor, start_time, end_time)
+
+    return await _serve_cached(request, db, WeatherData, "weather", params, cache_manager.READING_TTL, load)
+
+async def _aggregate(request: Request, db: AsyncSession, model, name: str, bucket: str, agg: str, fields: Optional[str], start_time, end_time):
+    """Shared implementation of the /.../aggregate endpoints."""
     try:
-        # Cap the limit to a maximum of 10,000
-        if limit > 10000:
-            limit = 10000
+        aggs = parse_list(agg, list(AGGREGATES), "agg")
+        selected_fields = parse_list(fields, AGGREGATE_FIELDS[model], "fields") or AGGREGATE_FIELDS[model]
+        if not aggs:
+            raise ValueError("At least one aggregate is required")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Query the weather_data table
-        query = db.query(WeatherData).order_by(WeatherData.timestamp.desc())
+    params = {"bucket": bucket, "agg": aggs, "fields": selected_fields, "start_time": start_time, "end_time": end_time}
 
-        # Apply time range filters
-        if start_time and end_time:
-            query = query.filter(WeatherData.timestamp.between(start_time, end_time))
-        elif start_time:
-            query = query.filter(WeatherData.timestamp >= start_time)
-        elif end_time:
-            query = query.filter(WeatherData.timestamp <= end_time)
+    async def load():
+        logger.info(f"Aggregating {name} data into {bucket} buckets ({','.join(aggs)})")
+        try:
+            rows = await aggregate_readings(db, model, bucket, aggs, selected_fields, start_time, end_time)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        metrics.observe("db_rows_returned", len(rows), buckets=metrics.ROW_BUCKETS, table=model.__tablename__)
+        adapter = TypeAdapter(List[AggregateBucketResponse])
+        with metrics.timed("serialization_seconds", format="json", source="aggregate"), profiling.span("serialize"):
+            body = adapter.dump_json(adapter.validate_python(rows))
+        return cache_manager.CachedResponse(body=body, headers={})
 
-        # Apply limit and offset
-        query = query.offset(offset).limit(limit)
-        data = query.all()
+    return await _serve_cached(request, db, model, name, params, cache_manager.AGGREGATE_TTLS[bucket], load)
 
-        if not data:
-            raise HTTPException(status_code=404, detail="No weather data found")
 
-        return data
-    except Exception as e:
-        # Log error and return a readable response
-        logger.error(f"Error fetching weather data: {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
+@router.get("/aqi_data/aggregate", response_model=List[AggregateBucketResponse])
+async def get_aqi_data_aggregate(
+    request: Request,
+    bucket: Literal["1m", "5m", "1h", "1d"] = Query("1h"),
+    agg: str = Query("avg"),  # Comma-separated: avg,min,max,p95
+    fields: Optional[str] = Query(None),  # Comma-separated columns, defaults to all numeric columns
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _aggregate(request, db, AQIReading, "AQI", bucket, agg, fields, start_time, end_time)
+
+
+@router.get("/zphs01b_data/aggregate", response_model=List[AggregateBucketResponse])
+async def get_zphs01b_data_aggregate(
+    request: Request,
+    bucket: Literal["1m", "5m", "1h", "1d"] = Query("1h"),
+    agg: str = Query("avg"),
+    fields: Optional[str] = Query(None),
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _aggregate(request, db, ZPHS01BReading, "ZPHS01B", bucket, agg, fields, start_time, end_time)
+
+
+@router.get("/weather_data/aggregate", response_model=List[AggregateBucketResponse])
+async def get_weather_data_aggregate(
+    request: Request,
+    bucket: Literal["1m", "5m", "1h", "1d"] = Query("1h"),
+    agg: str = Query("avg"),
+    fields: Optional[str] = Query(None),
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await _aggregate(request, db, WeatherData, "weather", bucket, agg, fields, start_time, end_time)
+
+
+# Reading tables by API name, with the schema whose fields become the exported or pushed columns
+READING_TABLES = {
+    "aqi_data": (AQIReading, AQIReadingResponse),
+    "zphs01b_data": (ZPHS01BReading, ZPHS01BReadingResponse),
+    "weather_data": (WeatherData, WeatherDataResponse),
+}
+
+# Rows fetched from the server-side cursor and sent per chunk
+EXPORT_CHUNK_ROWS = 2000
+
+EXPORT_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+async def _export_chunks(model, schema, fmt: str, start_time, end_time):
+    """Yield the export body chunk by chunk from a server-side cursor, oldest reading first."""
+    fields = list(schema.model_fields)
+    if fmt == "csv":
+        yield csv_chunk([fields], len(fields))
+
+    query = select(*schema_columns(model, schema), model.id).order_by(model.timestamp, model.id)
+    query = apply_time_range(query, model, start_time, end_time)
+    exported = 0
+    # The session belongs to the stream: request dependencies are closed before the body is sent
+    async with AsyncSessionLocal() as db:
+        try:
+            result = await db.stream(query.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+            async for rows in result.partitions():
+                yield ndjson_chunk(fields, rows) if fmt == "ndjson" else csv_chunk(rows, len(fields))
+                exported += len(rows)
+        except Exception as e:
+            # Headers are already sent, so the client sees a truncated body
+            logger.error(f"Export of {model.__tablename__} failed after {exported} rows: {e}")
+            raise
+    logger.info(f"Exported {exported} rows of {model.__tablename__} as {fmt}")
+
+
+@router.get("/export")
+async def export_readings(
+    table: Literal["aqi_data", "zphs01b_data", "weather_data"] = Query("aqi_data"),
+    format: Literal["ndjson", "csv"] = Query("ndjson"),
+    start_time: Optional[datetime] = Query(None),
+    end_time: Optional[datetime] = Query(None),
+):
+    """Stream every reading in the window as NDJSON or CSV, in constant memory."""
+    model, schema = READING_TABLES[table]
+    return StreamingResponse(
+        _export_chunks(model, schema, format, start_time, end_time),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
+
+
+# Seconds between keep-alive comments on an idle live stream, so proxies do not close it
+LIVE_KEEPALIVE_SECONDS = 15
+
+async def _live_events(names: dict):
+    """Yield Server-Sent Events for new rows of the tables in `names` (table name -> API name)."""
+    queue = live_feed.subscribe(names)
+    try:
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                message = await asyncio.wait_for(queue.get(), LIVE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if message is None:
+                return  # Dropped for falling behind; the browser reconnects
+            table, row_id, row = message
+            yield f"id: {row_id}\nevent: {names[table]}\ndata: ".encode() + row + b"\n\n"
+    finally:
+        live_feed.unsubscribe(queue)
+
+
+@router.get("/live")
+async def live_readings(
+    tables: Optional[str] = Query(None),  # Comma-separated API names, defaults to every reading table
+):
+    """Push each new reading as a Server-Sent Event named after its table (aqi_data, zphs01b_data, weather_data)."""
+    try:
+        selected = parse_list(tables, list(READING_TABLES), "tables") or list(READING_TABLES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    names = {READING_TABLES[name][0].__tablename__: name for name in selected}
+    return StreamingResponse(
+        _live_events(names),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,124 @@
+# batch_writer.py
+import asyncio
+import logging
+import os
+from sqlalchemy import insert
+from db import SessionLocal
+from models import RequestLog, TrackingEvent
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class BatchWriter:
+    """
+    Buffer rows for one model in a bounded in-memory queue and insert them in batches from a
+    background task, so callers on the event loop never wait for the database.
+
+    A batch is flushed when it reaches `batch_size` rows or `flush_interval` seconds after its
+    first row arrived. When the queue is full new rows are dropped and counted rather than
+    blocking the caller.
+    """
+
+    def __init__(self, model, name: str, max_queue: int = 10000, batch_size: int = 500, flush_interval: float = 2.0):
+        self.model = model
+        self.name = name
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = None
+        self._task = None
+
+    def start(self):
+        """Create the queue and writer task on the running event loop."""
+        self.queue = asyncio.Queue(maxsize=self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    def add(self, row: dict) -> bool:
+        """Queue one row (column name -> value) without blocking. Returns False if it was dropped."""
+        if self._task is None or self._task.done():
+            metrics.increment("batch_writer_dropped_total", writer=self.name)
+            return False
+        try:
+            self.queue.put_nowait(row)
+        except asyncio.QueueFull:
+            metrics.increment("batch_writer_dropped_total", writer=self.name)
+            return False
+        metrics.increment("batch_writer_enqueued_total", writer=self.name)
+        return True
+
+    async def stop(self):
+        """Flush everything queued so far and stop the writer task."""
+        if self._task is None:
+            return
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            metrics.set_gauge("batch_writer_queue_depth", self.queue.qsize(), writer=self.name)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch):
+        try:
+            with metrics.timed("batch_writer_flush_seconds", writer=self.name):
+                await asyncio.to_thread(self._insert, batch)
+            metrics.increment("batch_writer_written_total", len(batch), writer=self.name)
+        except Exception as e:
+            metrics.increment("batch_writer_failed_total", len(batch), writer=self.name)
+            logger.error(f"Error writing {len(batch)} {self.name} rows: {e}")
+
+    def _insert(self, batch):
+        # executemany of a Core insert is sent as multi-row INSERT ... VALUES statements
+        with SessionLocal() as db:
+            db.execute(insert(self.model), batch)
+            db.commit()
+
+
+request_log_writer = BatchWriter(
+    RequestLog,
+    "request_logs",
+    max_queue=int(os.getenv("REQUEST_LOG_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("REQUEST_LOG_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("REQUEST_LOG_FLUSH_SECONDS", "2")),
+)
+
+tracking_event_writer = BatchWriter(
+    TrackingEvent,
+    "tracking_events",
+    max_queue=int(os.getenv("TRACKING_EVENT_QUEUE_SIZE", "10000")),
+    batch_size=int(os.getenv("TRACKING_EVENT_BATCH_SIZE", "500")),
+    flush_interval=float(os.getenv("TRACKING_EVENT_FLUSH_SECONDS", "2")),
+)
+
+# Writers started and flushed by the app's startup and shutdown events
+WRITERS = [request_log_writer, tracking_event_writer]
@@ -0,0 +1,92 @@
+# load_test.py
+"""
+Step up the number of concurrent clients against a running backend and report throughput and
+latency percentiles per step, to find the concurrency at which p99 latency degrades.
+
+Start the API with the response cache off so every request reaches the database, then point
+the script at it:
+
+    CACHE_BACKEND=none uvicorn main:app --port 8082
+    python benchmarks/load_test.py --url http://localhost:8082 --path "/aqi_data?limit=500"
+    python benchmarks/load_test.py --levels 1 8 64 256 --duration 20
+
+The client runs in a single process; check that it is not the bottleneck (CPU well below 100%)
+before reading much into the highest levels.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_level(url: str, concurrency: int, duration: float, headers: dict):
+    """Keep `concurrency` requests in flight for `duration` seconds; return latencies and error count."""
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(client):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code >= 400:
+                    errors += 1
+                    continue
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Find the concurrency at which p99 latency degrades.")
+    parser.add_argument("--url", default="http://localhost:8082", help="Base URL of the backend")
+    parser.add_argument("--path", default="/aqi_data?limit=500", help="Request path and query")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64, 128, 256],
+                        help="Concurrent clients per step")
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per step")
+    parser.add_argument("--degrade-factor", type=float, default=3,
+                        help="p99 this many times the first step's p99 counts as degraded")
+    parser.add_argument("--accept-encoding", default="identity", help="Accept-Encoding sent with every request")
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + args.path
+    headers = {"Accept-Encoding": args.accept_encoding}
+    print(f"GET {url}, {args.duration:g}s per step")
+    print(f"{'clients':>8} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+    baseline = None
+    degraded_at = None
+    for concurrency in args.levels:
+        latencies, errors = await run_level(url, concurrency, args.duration, headers)
+        if not latencies:
+            print(f"{concurrency:>8} {'-':>9} {'-':>9} {'-':>9} {'-':>9} {errors:>7}")
+            continue
+        p99 = percentile(latencies, 0.99)
+        print(f"{concurrency:>8} {len(latencies) / args.duration:>9.1f} {statistics.median(latencies) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.95) * 1000:>9.1f} {p99 * 1000:>9.1f} {errors:>7}")
+        baseline = baseline or p99
+        if degraded_at is None and p99 > baseline * args.degrade_factor:
+            degraded_at = concurrency
+
+    if degraded_at:
+        print(f"p99 exceeded {args.degrade_factor:g}x the single-client p99 at {degraded_at} concurrent clients")
+    else:
+        print(f"p99 stayed within {args.degrade_factor:g}x the single-client p99 at every step")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,183 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class CacheError(Exception):
+    """Raised by a backend when its store cannot be reached; callers fall back to the database."""
+
+
+class CacheBackend:
+    """
+    Store behind cache_manager: plain key/value entries with a TTL, plus one ring buffer of
+    recent readings per table (members scored by timestamp, newest `limit` kept).
+    """
+
+    # True if calls wait on I/O; async callers then run them in a thread
+    blocking = False
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: int):
+        raise NotImplementedError
+
+    def recent_state(self, table: str) -> Tuple[Optional[int], Optional[float], int]:
+        """Return (last id added, oldest score, number of members) of a ring buffer."""
+        raise NotImplementedError
+
+    def recent_update(self, table: str, members: Dict[bytes, float], last_id: int, limit: int, reset: bool = False):
+        """Add members (replacing everything if `reset`), trim to the newest `limit` and record `last_id`."""
+        raise NotImplementedError
+
+    def recent_range(self, table: str, max_score, min_score, limit: int) -> Tuple[List[bytes], Optional[float], Optional[float], int]:
+        """
+        Return (up to `limit` members scored in [min_score, max_score] newest first,
+        oldest score, newest score, size).
+        """
+        raise NotImplementedError
+
+
+class RedisBackend(CacheBackend):
+    """Entries are Redis strings; ring buffers are sorted sets recent:<table> with recent:<table>:last_id."""
+
+    blocking = True
+
+    def __init__(self, url: str):
+        import redis
+        self.redis = redis
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=0.2, socket_timeout=0.5)
+
+    def _call(self, fn, *args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except self.redis.RedisError as e:
+            raise CacheError(str(e)) from e
+
+    def get(self, key):
+        return self._call(self.client.get, key)
+
+    def set(self, key, value, ttl):
+        self._call(self.client.set, key, value, ex=ttl)
+
+    def recent_state(self, table):
+        key = f"recent:{table}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.get(f"{key}:last_id")
+        pipe.zrange(key, 0, 0, withscores=True)
+        pipe.zcard(key)
+        last_id, oldest, size = self._call(pipe.execute)
+        return (int(last_id) if last_id is not None else None), (oldest[0][1] if oldest else None), size
+
+    def recent_update(self, table, members, last_id, limit, reset=False):
+        key = f"recent:{table}"
+        pipe = self.client.pipeline()
+        if reset:
+            pipe.delete(key)
+        if members:
+            pipe.zadd(key, members)
+        pipe.zremrangebyrank(key, 0, -limit - 1)
+        pipe.set(f"{key}:last_id", last_id)
+        self._call(pipe.execute)
+
+    def recent_range(self, table, max_score, min_score, limit):
+        key = f"recent:{table}"
+        pipe = self.client.pipeline(transaction=False)
+        pipe.zrevrangebyscore(key, max_score, min_score, start=0, num=limit)
+        pipe.zrange(key, 0, 0, withscores=True)
+        pipe.zrange(key, -1, -1, withscores=True)
+        pipe.zcard(key)
+        members, oldest, newest, size = self._call(pipe.execute)
+        return members, (oldest[0][1] if oldest else None), (newest[0][1] if newest else None), size
+
+
+class _Ring:
+    def __init__(self):
+        self.scores = []   # ascending
+        self.members = []  # in score order
+        self.known = set()
+        self.last_id = None
+
+
+class MemoryBackend(CacheBackend):
+    """
+    In-process store for single-node deployments and local runs without Redis.
+
+    Entries are kept in LRU order and evicted once their total size exceeds `max_bytes`
+    (expired entries are dropped when read). Ring buffers are sorted lists bounded by their
+    row limit rather than by `max_bytes`. Every worker process has its own copy.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.rings = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        _, value = self.entries.pop(key)
+        self.size -= len(value)
+
+    def recent_state(self, table):
+        with self.lock:
+            ring = self.rings.get(table)
+            if ring is None:
+                return None, None, 0
+            return ring.last_id, (ring.scores[0] if ring.scores else None), len(ring.scores)
+
+    def recent_update(self, table, members, last_id, limit, reset=False):
+        with self.lock:
+            ring = self.rings.get(table)
+            if ring is None or reset:
+                ring = self.rings[table] = _Ring()
+            for member, score in members.items():
+                if member in ring.known:
+                    continue
+                index = bisect.bisect_right(ring.scores, score)
+                ring.scores.insert(index, score)
+                ring.members.insert(index, member)
+                ring.known.add(member)
+            excess = len(ring.scores) - limit
+            if excess > 0:
+                ring.known.difference_update(ring.members[:excess])
+                del ring.scores[:excess]
+                del ring.members[:excess]
+            ring.last_id = last_id
+
+    def recent_range(self, table, max_score, min_score, limit):
+        with self.lock:
+            ring = self.rings.get(table)
+            if ring is None:
+                return [], None, None, 0
+            low = 0 if min_score == "-inf" else bisect.bisect_left(ring.scores, min_score)
+            high = len(ring.scores) if max_score == "+inf" else bisect.bisect_right(ring.scores, max_score)
+            members = ring.members[max(low, high - limit):high][::-1]
+            if not ring.scores:
+                return members, None, None, 0
+            return members, ring.scores[0], ring.scores[-1], len(ring.scores)
@@ -1,119 +1,291 @@
 import asyncio
-import logging
+import calendar
+import hashlib
 import json
-import redis
-from sqlalchemy.orm import Session
+import logging
+import os
+import time
+from collections import namedtuple
 from datetime import datetime
-from models import AQIReading, ZPHS01BReading
+from typing import Optional
+from sqlalchemy import select
+from db import SessionLocal
+from queries import fetch_latest_timestamp, latest_timestamp, naive_utc, schema_columns
+from serialization import dumps_row
+from cache_manager.backends import CacheError, MemoryBackend, RedisBackend
+import metrics
+import profiling
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Redis
-redis_client = redis.Redis(host='localhost', port=6379, db=0)
+# Cache store: redis (shared between workers), memory (per process) or none
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+CACHE_MEMORY_MAX_BYTES = int(os.getenv("CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# New readings arrive roughly every 30 seconds, so a cached page is at most one reading behind
+READING_TTL = int(os.getenv("CACHE_READING_TTL", "30"))
+
+# Aggregates change only when their newest bucket does; coarser buckets can live longer
+AGGREGATE_TTLS = {"1m": 30, "5m": 60, "1h": 300, "1d": 1800}
+
+# Windows that end before the newest reading cannot change any more
+HISTORICAL_TTL = int(os.getenv("CACHE_HISTORICAL_TTL", "3600"))
+
+# How often the newest timestamp of each table is polled, and how long the store is skipped after an error
+LATEST_POLL_SECONDS = 10
+RETRY_SECONDS = 30
+
+# Rows kept per table in the recent-readings ring buffer (members scored by timestamp)
+RECENT_LIMIT = int(os.getenv("CACHE_RECENT_LIMIT", "20000"))
+
+# Ids below the last one seen that are read again on every refresh, for rows whose transaction
+# committed after a higher id had already been read (ids are taken at insert, not at commit)
+RECENT_OVERLAP = int(os.getenv("CACHE_RECENT_OVERLAP", "200"))
+
+# Newest reading timestamp per table, refreshed by poll_database()
+latest_timestamps = {}
 
-# Cache keys for specific queries
-AQI_CACHE_KEY = "aqi_data_cache"
-ZPHS01B_CACHE_KEY = "zphs01b_data_cache"
-CACHE_LIMIT = 20000  # Limit to the last 20,000 records
+_down_until = 0.0
 
-# Helper function to convert SQLAlchemy objects to dictionaries
-def serialize_sqlalchemy_object(obj):
+# A cached response: the JSON body plus headers such as X-Next-Cursor
+CachedResponse = namedtuple("CachedResponse", ["body", "headers"])
+
+
+def _encode(entry: CachedResponse) -> bytes:
+    return json.dumps(entry.headers).encode() + b"\n" + entry.body
+
+
+def _decode(value: bytes) -> CachedResponse:
+    headers, body = value.split(b"\n", 1)
+    return CachedResponse(body=body, headers=json.loads(headers))
+
+
+def _normalize(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return sorted(value)
+    return value
+
+
+def cache_key(table: str, params: dict) -> str:
     """
-    Convert a SQLAlchemy model instance into a dictionary, excluding non-serializable fields.
+    Build the cache key for a query on `table`.
+
+    Parameters are normalized (datetimes as ISO strings, lists sorted) and hashed. Unless the
+    query window ends before the newest reading, the newest timestamp of the table is part of
+    the key, so a new reading moves every live query to a fresh key and stale entries just expire.
     """
-    # Use the object's __dict__ attribute but exclude internal SQLAlchemy attributes and methods
-    serialized_data = {}
-    for key, value in obj.__dict__.items():
-        if not key.startswith('_'):  # Exclude private attributes
-            if isinstance(value, datetime):  # Convert datetime objects to strings
-                serialized_data[key] = value.isoformat()
-            else:
-                serialized_data[key] = value
-    return serialized_data
-
-# Function to fetch and update cache incrementally
-def update_cache_incrementally(db: Session, cache_key: str, model, limit):
-    # Get the latest timestamp from the cache
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        try:
-            data = json.loads(cached_data)  # Use json.loads() for deserialization
-        except json.JSONDecodeError:
-            data = []  # If deserialization fails, reset to an empty list
-        last_timestamp = max(
-            datetime.fromisoformat(item['timestamp']) for item in data if 'timestamp' in item
-        ) if data else datetime.min
+    normalized = json.dumps({k: _normalize(v) for k, v in params.items() if v is not None}, sort_keys=True)
+    digest = hashlib.sha1(normalized.encode()).hexdigest()
+    return f"query:{table}:{_version(table, params)}:{digest}"
+
+
+def _version(table, params):
+    if is_historical(table, params):
+        return "historical"
+    latest = latest_timestamps.get(table)
+    return latest.isoformat() if latest else "unknown"
+
+
+def is_historical(table: str, params: dict) -> bool:
+    """True if the query has an end_time before the newest reading, so its result is final."""
+    end_time = params.get("end_time")
+    latest = latest_timestamps.get(table)
+    if end_time is None or latest is None:
+        return False
+    return naive_utc(end_time) < naive_utc(latest)
+
+
+async def _call(fn, *args):
+    # Redis commands block on the network, so they run in a thread instead of on the event loop
+    with profiling.span("cache"):
+        if backend.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+
+async def read_through(table: str, params: dict, ttl: int, loader) -> CachedResponse:
+    """
+    Return the cached response for (table, params), awaiting `loader()` and caching its
+    CachedResponse on a miss. Store errors fall back to the loader.
+    """
+    if not _available():
+        return await loader()
+
+    key = cache_key(table, params)
+    try:
+        value = await _call(backend.get, key)
+    except CacheError as e:
+        _failed(e)
+        metrics.increment("cache_requests_total", result="error", table=table)
+        return await loader()
+
+    if value is not None:
+        metrics.increment("cache_requests_total", result="hit", table=table)
+        return _decode(value)
+
+    metrics.increment("cache_requests_total", result="miss", table=table)
+    entry = await loader()
+    if is_historical(table, params):
+        ttl = HISTORICAL_TTL
+    try:
+        await _call(backend.set, key, _encode(entry), ttl)
+    except CacheError as e:
+        logger.warning(f"Failed to store cache entry {key}: {e}")
+    return entry
+
+
+def create_backend(name: str):
+    """Build the store selected by CACHE_BACKEND; None disables caching."""
+    if name == "redis":
+        # Connections are opened lazily on the first command
+        return RedisBackend(REDIS_URL)
+    if name == "memory":
+        return MemoryBackend(CACHE_MEMORY_MAX_BYTES)
+    if name == "none":
+        return None
+    raise ValueError(f"Unknown CACHE_BACKEND {name!r}, expected redis, memory or none")
+
+
+backend = create_backend(CACHE_BACKEND)
+
+
+def _available():
+    return backend is not None and time.monotonic() >= _down_until
+
+
+def _failed(error):
+    global _down_until
+    _down_until = time.monotonic() + RETRY_SECONDS
+    logger.warning(f"Cache store unavailable, bypassing cache for {RETRY_SECONDS}s: {error}")
+
+
+def _score(timestamp: datetime) -> float:
+    timestamp = naive_utc(timestamp)
+    return calendar.timegm(timestamp.timetuple()) + timestamp.microsecond / 1e6
+
+
+def refresh_recent(db, model, schema):
+    """
+    Add rows inserted since the last refresh to the table's ring buffer.
+
+    Members are "<id>:<row JSON>" scored by timestamp, so an update costs O(new rows). New rows
+    are found by id, which also picks up late rows synced with older timestamps; those are only
+    kept if they fall inside the window the buffer already covers, so the buffer always holds
+    every row between its oldest and newest score. The last RECENT_OVERLAP ids are read again
+    each time to catch rows that committed out of id order; members already in the buffer are
+    not added twice. Trimming by rank drops the oldest rows.
+    """
+    table = model.__tablename__
+    last_id, oldest, size = backend.recent_state(table)
+
+    fields = list(schema.model_fields)
+    columns = [*schema_columns(model, schema), model.id]
+
+    rows = []
+    if last_id is not None:
+        rows = db.execute(
+            select(*columns)
+            .where(model.id > last_id - RECENT_OVERLAP)
+            .order_by(model.id.desc())
+            .limit(RECENT_LIMIT + RECENT_OVERLAP + 1)
+        ).all()
+        if not rows:
+            return
+
+    reset = last_id is None or len(rows) > RECENT_LIMIT + RECENT_OVERLAP
+    if reset:
+        # First fill, or too many new rows to patch in: rebuild from the newest readings
+        rows = db.execute(
+            select(*columns).order_by(model.timestamp.desc(), model.id.desc()).limit(RECENT_LIMIT)
+        ).all()
+        # Only ids that were read count as seen; later ones are picked up by the next refresh
+        last_id = max((row.id for row in rows), default=0)
     else:
-        data = []
-        last_timestamp = datetime.min
-
-    # Fetch new data from the database
-    new_data_query = (
-        db.query(model)
-        .filter(model.timestamp > last_timestamp)
-        .order_by(model.timestamp.desc())
-        .limit(limit)
+        last_id = max(last_id, *(row.id for row in rows))
+        if oldest is not None and size >= RECENT_LIMIT:
+            rows = [row for row in rows if _score(row.timestamp) >= oldest]
+
+    members = {f"{row.id}:".encode() + dumps_row(fields, row): _score(row.timestamp) for row in rows}
+    backend.recent_update(table, members, last_id, RECENT_LIMIT, reset)
+
+
+async def read_recent(table: str, limit: int, start_time=None, end_time=None):
+    """
+    Return up to `limit` recent readings, newest first, as [(id, row JSON)], or None if the
+    ring buffer cannot answer the query completely (Postgres has to).
+    """
+    if not _available():
+        return None
+
+    max_score = _score(end_time) if end_time else "+inf"
+    min_score = _score(start_time) if start_time else "-inf"
+    try:
+        members, oldest, newest, size = await _call(backend.recent_range, table, max_score, min_score, limit)
+    except CacheError as e:
+        _failed(e)
+        return None
+
+    if not size or newest is None:
+        # Not filled yet (first poll pending, key evicted or table empty)
+        metrics.increment("recent_buffer_reads_total", result="miss", table=table)
+        return None
+
+    # The buffer trails the table until the next poll; it can only answer windows it has caught up with
+    latest = latest_timestamps.get(table)
+    caught_up = latest is None or newest >= min(_score(latest), max_score if end_time else float("inf"))
+
+    # The buffer holds every row from its oldest score on, or the whole table if it is not full
+    covered = caught_up and (
+        size < RECENT_LIMIT
+        or len(members) == limit
+        or (start_time is not None and min_score >= oldest)
     )
-    new_data = new_data_query.all()
-    # logger.info(f"new data {new_data} for cache_key :- {cache_key} at {datetime.now()}")
-    
-    # Log the deserialized new data (consider logging only a sample if the data is large)
-    # logger.info(f"if no new data Deserialized new data sample (first 5 records) for cache_key: {cache_key} at {datetime.now()} - {json.dumps(data[:1], indent=2)}")
-    
-    
-    if new_data:
-        # Serialize new data
-        new_data_dicts = [serialize_sqlalchemy_object(item) for item in new_data]
-
-        # Add new data to the top of the existing data
-        data = new_data_dicts + data  # This will prepend new_data_dicts to data
-
-        # Log the deserialized new data (consider logging only a sample if the data is large)
-        deserialized_new_data = [serialize_sqlalchemy_object(item) for item in new_data]
-        # logger.info(f"Deserialized new data sample (first 5 records) for cache_key: {cache_key} at {datetime.now()} - {json.dumps(deserialized_new_data[:1], indent=2)}")
-
-        # Log the top 5 items in the `data` list after extending
-        # if data:
-            # logger.info(f"Before trim - Top 5 items in cache after extending for cache_key: {cache_key} at {datetime.now()} - {json.dumps(data[:1], indent=2)}")
-
-        # Truncate the cache to keep only the most recent CACHE_LIMIT records
-        if len(data) > CACHE_LIMIT:
-            data = data[:CACHE_LIMIT]  # Keep the most recent CACHE_LIMIT records
-
-        # Log the top 5 items in the `data` list after trimming
-        # logger.info(f"After trim - Top 5 items in cache for cache_key: {cache_key} at {datetime.now()} - {json.dumps(data[:1], indent=2)}")
-
-        # Update the cache
-        redis_client.set(cache_key, json.dumps(data))  # Use json.dumps() for serialization
-        logger.info(f"Cache updated for cache_key: {cache_key} at {datetime.now()}")
-
-
-# Function to get cached data
-def get_cached_data(cache_key):
-    cached_data = redis_client.get(cache_key)
-    if cached_data:
-        try:
-            return json.loads(cached_data)  # Use json.loads() for deserialization
-        except json.JSONDecodeError:
-            return None  # Return None if deserialization fails
-    return None
-
-# Function to update cache
-def update_cache(cache_key, data):
-    # Convert objects to dictionaries and serialize using json
-    serialized_data = json.dumps([serialize_sqlalchemy_object(item) for item in data])
-    redis_client.set(cache_key, serialized_data)
-
-# Background task to update cache frequently
-async def poll_database(get_db, AQIReading, ZPHS01BReading):
-    while True:
-        db = next(get_db())
+    metrics.increment("recent_buffer_reads_total", result="hit" if covered else "miss", table=table)
+    if not covered:
+        return None
+
+    rows = []
+    for member in members:
+        row_id, row = member.split(b":", 1)
+        rows.append((int(row_id), row))
+    return rows
 
-        # Update cache incrementally for both tables
-        update_cache_incrementally(db, AQI_CACHE_KEY, AQIReading, 5000)
-        update_cache_incrementally(db, ZPHS01B_CACHE_KEY, ZPHS01BReading, 5000)
 
-        # Sleep for 1 minute before polling again
-        await asyncio.sleep(60)
+async def refresh_latest(db, model) -> Optional[datetime]:
+    """Look up the newest timestamp of a table (one indexed max()) and use it for cache keys right away."""
+    latest = latest_timestamps[model.__tablename__] = await fetch_latest_timestamp(db, model)
+    return latest
+
+
+def etag(table: str, params: dict) -> str:
+    """Strong ETag for a query: changes exactly when its cache key does."""
+    return '"' + hashlib.sha1(cache_key(table, params).encode()).hexdigest() + '"'
+
+
+def refresh(readings):
+    """Refresh the ring buffers, then the newest timestamp of each table (one indexed max() per table)."""
+    with SessionLocal() as db:
+        for model, schema in readings.items():
+            if _available():
+                try:
+                    refresh_recent(db, model, schema)
+                except CacheError as e:
+                    _failed(e)
+            latest_timestamps[model.__tablename__] = latest_timestamp(db, model)
+
+
+# Background task keeping the ring buffers and cache keys in step with new readings.
+# `readings` maps each reading model to the response schema its rows are cached as.
+async def poll_database(readings):
+    while True:
+        try:
+            with metrics.timed("cache_poll_seconds"):
+                await asyncio.to_thread(refresh, readings)
+        except Exception as e:
+            logger.error(f"Error polling database: {e}")
+        await asyncio.sleep(LATEST_POLL_SECONDS)
@@ -0,0 +1,85 @@
+# compression.py
+import gzip
+import os
+from typing import Optional
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.datastructures import Headers
+
+try:
+    import brotli
+except ImportError:  # Optional: br is only offered when brotli is installed
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # Optional: zstd is only offered when zstandard is installed
+    zstandard = None
+
+# Bodies smaller than this are sent as they are; compressing them saves less than it costs
+MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# Content codings the server can produce, most preferred first
+ENCODINGS = [name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", gzip)) if module is not None]
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the preferred coding the client accepts (q > 0), or None for identity."""
+    accepted = {}
+    for item in (accept_encoding or "").split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a response body. Levels favour ratio a little, since cached bodies are compressed once."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(body)
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=6)
+    raise ValueError(f"Unknown encoding {encoding!r}")
+
+
+class UnencodedGZipMiddleware:
+    """
+    GZipMiddleware limited to responses that are neither encoded yet nor event streams.
+
+    Pre-compressed cache entries (Content-Encoding already set) and the /live stream bypass the
+    gzip responder entirely. Older Starlette releases would otherwise compress the former a second
+    time and buffer the latter.
+    """
+
+    def __init__(self, app, minimum_size: int):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        bypass = False
+
+        async def app(scope, receive, gzip_send):
+            async def route(message):
+                nonlocal bypass
+                if message["type"] == "http.response.start":
+                    headers = Headers(raw=message["headers"])
+                    bypass = "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream")
+                await (send if bypass else gzip_send)(message)
+
+            await self.app(scope, receive, route)
+
+        await GZipMiddleware(app, minimum_size=self.minimum_size)(scope, receive, send)
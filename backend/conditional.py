@@ -0,0 +1,43 @@
+# conditional.py
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+from fastapi import Request
+
+# Browsers may reuse a live response this long before revalidating. It matches how often the
+# newest-timestamp poller runs, well inside the ~30s sensor cadence.
+LIVE_MAX_AGE = 10
+
+
+def _http_date(timestamp: datetime) -> datetime:
+    # Naive timestamps are stored as written by the collector and treated as UTC here
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def validators(etag: str, latest: Optional[datetime], max_age: int) -> Dict[str, str]:
+    """ETag, Last-Modified and Cache-Control headers sent with both 200 and 304 responses."""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}, must-revalidate"}
+    if latest is not None:
+        headers["Last-Modified"] = format_datetime(_http_date(latest), usegmt=True)
+    return headers
+
+
+def not_modified(request: Request, etag: str, latest: Optional[datetime]) -> bool:
+    """
+    True if the client's copy is current. If-None-Match takes precedence over
+    If-Modified-Since, as in RFC 9110.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and latest is not None:
+        try:
+            return _http_date(latest) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
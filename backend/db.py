@@ -1,7 +1,12 @@
 import os
-from sqlalchemy import create_engine
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
+import metrics
+import profiling
 
 # Load environment variables from .env file
 load_dotenv()
@@ -9,14 +14,90 @@ load_dotenv()
 # Read DATABASE_URL from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Connection pool of each engine. A request waits at most DB_POOL_TIMEOUT seconds for a
+# connection before failing with a 503, instead of queueing behind a burst indefinitely.
+POOL_OPTIONS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),  # Seconds; drops connections idle-killed by firewalls
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "true").lower() == "true",
+}
+
+# Server-side limit per statement in milliseconds (0 disables), so a runaway query frees its connection
+STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+
+# Prepared statements kept per asyncpg connection; set to 0 behind PgBouncer in transaction mode
+PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "256"))
+
 # Set up SQLAlchemy engine and session
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"options": f"-c statement_timeout={STATEMENT_TIMEOUT_MS}"},
+    **POOL_OPTIONS,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Async engine (asyncpg) for request handlers and the monitor loop. Background threads such as
+# the batch writers and the cache poller keep using the synchronous engine above.
+# asyncpg prepares every statement and caches it per connection, so the hot queries (latest
+# timestamp, reading pages) skip parsing and, once Postgres settles on a generic plan, planning
+# across the partitions of aqi_readings.
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or make_url(DATABASE_URL).set(drivername="postgresql+asyncpg")
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    connect_args={
+        "server_settings": {"statement_timeout": str(STATEMENT_TIMEOUT_MS)},
+        "prepared_statement_cache_size": PREPARED_STATEMENT_CACHE_SIZE,
+    },
+    **POOL_OPTIONS,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+ENGINES = {"sync": engine, "async": async_engine.sync_engine}
+
+
+def _count_invalidated(dbapi_connection, connection_record, exception):
+    # Pre-ping failures and connection errors discard pooled connections
+    metrics.increment("db_pool_invalidated_total")
+
+
+def _time_queries(name, pooled):
+    # The execution context lives for one statement, so it carries the start time
+    @event.listens_for(pooled, "before_cursor_execute")
+    def before(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(pooled, "after_cursor_execute")
+    def after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        metrics.observe("db_query_seconds", elapsed, engine=name)
+        profiling.add("sql", elapsed)
+        profiling.slow_query_log.finished(name, statement, parameters, executemany, elapsed)
+
+
+for _name, _engine in ENGINES.items():
+    event.listen(_engine, "invalidate", _count_invalidated)
+    _time_queries(_name, _engine)
+
+
+def record_pool_metrics():
+    """Publish the current pool utilization of both engines as gauges."""
+    for name, pooled in ENGINES.items():
+        pool = pooled.pool
+        metrics.set_gauge("db_pool_size", pool.size(), engine=name)
+        metrics.set_gauge("db_pool_checked_out", pool.checkedout(), engine=name)
+        metrics.set_gauge("db_pool_overflow", max(pool.overflow(), 0), engine=name)
+        metrics.set_gauge("db_pool_idle", pool.checkedin(), engine=name)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,153 @@
+# live_feed.py
+import asyncio
+import json
+import logging
+import os
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from db import ASYNC_DATABASE_URL, AsyncSessionLocal
+from models import AQIReading, ZPHS01BReading, WeatherData
+from schemas import AQIReadingResponse, ZPHS01BReadingResponse, WeatherDataResponse
+from queries import schema_columns
+from serialization import dumps_row
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Channel notified by the collector's insert triggers (migration d16118857ae5)
+CHANNEL = "new_readings"
+
+# Messages buffered per client; a client that falls this far behind is disconnected and reconnects
+CLIENT_QUEUE_SIZE = int(os.getenv("LIVE_CLIENT_QUEUE_SIZE", "1000"))
+
+# Seconds between checks of the listening connection, and before reconnecting after it is lost
+CHECK_SECONDS = 5
+RECONNECT_SECONDS = 5
+
+
+def _listen_dsn() -> str:
+    # asyncpg.connect takes a plain postgresql:// DSN without SQLAlchemy's dialect options
+    url = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql")
+    url = url.difference_update_query(["prepared_statement_cache_size"])
+    return url.render_as_string(hide_password=False)
+
+
+class LiveFeed:
+    """
+    Fan new readings out to every connected client from a single LISTEN connection.
+
+    The insert triggers send only (table, id); the feed reads each batch of new rows once, in
+    the same JSON format as the reading endpoints, and puts (table, id, row JSON) on the queue
+    of every subscriber of that table.
+    """
+
+    def __init__(self, readings):
+        # table name -> (model, response schema)
+        self.readings = {model.__tablename__: (model, schema) for model, schema in readings.items()}
+        self.subscribers = {}  # client queue -> set of table names
+        self.notified = None
+        self._task = None
+
+    def start(self):
+        """Create the notification queue and listener task on the running event loop."""
+        self.notified = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def subscribe(self, tables) -> asyncio.Queue:
+        """Register a client for new rows of `tables`. None on the queue means the client was dropped."""
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.subscribers[queue] = set(tables)
+        metrics.set_gauge("live_subscribers", len(self.subscribers))
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+        metrics.set_gauge("live_subscribers", len(self.subscribers))
+
+    def _on_notify(self, connection, pid, channel, payload):
+        try:
+            message = json.loads(payload)
+            self.notified.put_nowait((message["table"], int(message["id"])))
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring malformed {CHANNEL} notification {payload!r}: {e}")
+
+    async def _run(self):
+        import asyncpg
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(_listen_dsn())
+                await connection.add_listener(CHANNEL, self._on_notify)
+                logger.info(f"Listening for {CHANNEL} notifications")
+                while not connection.is_closed():
+                    await self._relay()
+                logger.warning(f"Live feed connection closed, reconnecting in {RECONNECT_SECONDS}s")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Live feed listener failed, reconnecting in {RECONNECT_SECONDS}s: {e}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(RECONNECT_SECONDS)
+
+    async def _relay(self):
+        """Wait for notifications, then read and broadcast every row notified so far."""
+        try:
+            notified = [await asyncio.wait_for(self.notified.get(), CHECK_SECONDS)]
+        except asyncio.TimeoutError:
+            return
+        while not self.notified.empty():
+            notified.append(self.notified.get_nowait())
+
+        pending = {}
+        for table, row_id in notified:
+            pending.setdefault(table, []).append(row_id)
+
+        for table, ids in pending.items():
+            metrics.increment("live_notifications_total", len(ids), table=table)
+            if table not in self.readings:
+                continue
+            model, schema = self.readings[table]
+            fields = list(schema.model_fields)
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(*schema_columns(model, schema), model.id)
+                    .where(model.id.in_(ids))
+                    .order_by(model.timestamp, model.id)
+                )).all()
+            for row in rows:
+                self._broadcast(table, row.id, dumps_row(fields, row))
+
+    def _broadcast(self, table: str, row_id: int, row: bytes):
+        for queue, tables in list(self.subscribers.items()):
+            if table not in tables:
+                continue
+            try:
+                queue.put_nowait((table, row_id, row))
+            except asyncio.QueueFull:
+                # Too slow to keep up: end its stream so the client reconnects instead of lagging
+                self.unsubscribe(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+                metrics.increment("live_dropped_subscribers_total")
+
+
+# Started and stopped by the app's startup and shutdown events
+live_feed = LiveFeed({
+    AQIReading: AQIReadingResponse,
+    ZPHS01BReading: ZPHS01BReadingResponse,
+    WeatherData: WeatherDataResponse,
+})
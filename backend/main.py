@@ -1,17 +1,30 @@
 import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
 import requests
 from fastapi import FastAPI, Request, Depends, HTTPException, Security
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.security import APIKeyHeader
 from api import endpoints
-from db import Base, engine, get_db
-from models import AQIReading, ZPHS01BReading
-from sqlalchemy.orm import Session
-from models import RequestLog
+from db import AsyncSessionLocal, Base, async_engine, engine, record_pool_metrics
+from models import AQIReading, ZPHS01BReading, WeatherData
+from schemas import AQIReadingResponse, ZPHS01BReadingResponse, WeatherDataResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
+from typing import Literal
 from cache_manager import cache_manager
+from pagination import CURSOR_HEADER
+from batch_writer import WRITERS, request_log_writer
+from live_feed import live_feed
+import metrics
+import compression
+import profiling
+
+logger = logging.getLogger(__name__)
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
@@ -40,22 +53,89 @@ async def log_request_ip(request: Request, call_next):
     endpoint = request.url.path
     method = request.method
 
-    # Save the IP address, endpoint, and method in the database
-    with next(get_db()) as db:
-        new_log = RequestLog(ip_address=client_ip, timestamp=datetime.utcnow(), endpoint=endpoint, method=method)
-        db.add(new_log)
-        db.commit()
+    # Queue the IP address, endpoint, and method; the writer inserts them in batches
+    request_log_writer.add({"ip_address": client_ip, "timestamp": datetime.utcnow(), "endpoint": endpoint, "method": method})
+
+    return response
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (/aqi_data, not the full URL) to keep the number of series bounded.
+    # Streaming responses (/export, /live) are timed to their first byte.
+    route = request.scope.get("route")
+    metrics.observe(
+        "http_request_duration_seconds",
+        time.perf_counter() - start,
+        method=request.method,
+        route=route.path if route else "unmatched",
+        status=response.status_code,
+    )
+    return response
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    # Opt-in per request with X-Profile: 1 or ?profile=1, for holders of the API key only
+    requested = request.headers.get("X-Profile") == "1" or request.query_params.get("profile") == "1"
+    if not requested or request.headers.get(API_KEY_NAME) != API_KEY:
+        return await call_next(request)
+
+    token = profiling.start()
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        spans = profiling.stop(token)
+    total = time.perf_counter() - start
 
+    response.headers["Server-Timing"] = profiling.server_timing(spans, total)
+    breakdown = ", ".join(f"{name} {seconds * 1000:.1f} ms ({count}x)" for name, (seconds, count) in spans.items())
+    logger.info(f"Profile {request.method} {request.url.path}?{request.url.query}: {total * 1000:.1f} ms total; {breakdown}")
     return response
 
+@app.get("/metrics")
+def get_metrics(format: Literal["prometheus", "json"] = "prometheus"):
+    """Every metric in the Prometheus text format, or as JSON with ?format=json."""
+    record_pool_metrics()
+    if format == "json":
+        return metrics.snapshot()
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
 # Event to run both background tasks on startup
 @app.on_event("startup")
 async def startup_event():
+    # Start the request log and tracking event writers
+    for writer in WRITERS:
+        writer.start()
+
+    # Listen for new readings and push them to /live clients
+    live_feed.start()
+
+    # Measure event loop lag for /metrics
+    asyncio.create_task(metrics.watch_event_loop())
+
+    # Explain sampled slow queries in the background
+    profiling.slow_query_log.start()
+
     # Start the first background task
     asyncio.create_task(monitor_aqi())
     
-    # Start the second background task (polling the database)
-    # asyncio.create_task(cache_manager.poll_database(get_db, AQIReading, ZPHS01BReading))
+    # Start the second background task (polling the database for the caches)
+    asyncio.create_task(cache_manager.poll_database({
+        AQIReading: AQIReadingResponse,
+        ZPHS01BReading: ZPHS01BReadingResponse,
+        WeatherData: WeatherDataResponse,
+    }))
+
+# Flush buffered rows before the process exits
+@app.on_event("shutdown")
+async def shutdown_event():
+    await live_feed.stop()
+    await profiling.slow_query_log.stop()
+    for writer in WRITERS:
+        await writer.stop()
+    await async_engine.dispose()
 
 # Register API endpoints
 app.include_router(endpoints.router)
@@ -66,8 +146,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[CURSOR_HEADER, "ETag"],  # Let browsers read the pagination cursor and validators
 )
 
+# Compress other large responses (exports, metrics); reading endpoints send pre-compressed
+# cached bodies, which bypass gzip like the /live event stream
+app.add_middleware(compression.UnencodedGZipMiddleware, minimum_size=compression.MIN_BYTES)
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -96,17 +181,21 @@ def can_send_alert(alert_type):
 
 async def monitor_aqi():
     while True:
-        with next(get_db()) as db:  # Get a database session
-            check_aqi_readings(db)
+        async with AsyncSessionLocal() as db:  # Get a database session
+            await check_aqi_readings(db)
         await asyncio.sleep(150)  # Wait for 150 seconds (2.5 minutes)
 
-def check_aqi_readings(db: Session):
+async def check_aqi_readings(db: AsyncSession):
     try:
         # Query the last 5 AQI readings ordered by timestamp
-        recent_readings = db.query(AQIReading).order_by(AQIReading.timestamp.desc()).limit(5).all()
+        recent_readings = (await db.execute(
+            select(AQIReading).order_by(AQIReading.timestamp.desc()).limit(5)
+        )).scalars().all()
 
         # Query the last 5 VOC readings ordered by timestamp
-        recent_voc_readings = db.query(ZPHS01BReading).order_by(ZPHS01BReading.timestamp.desc()).limit(5).all()
+        recent_voc_readings = (await db.execute(
+            select(ZPHS01BReading).order_by(ZPHS01BReading.timestamp.desc()).limit(5)
+        )).scalars().all()
 
         # Calculate average AQI if there are enough readings
         if len(recent_readings) == 5:
@@ -117,20 +206,20 @@ def check_aqi_readings(db: Session):
             avg_pm10_raw = round(sum(reading.pm10 for reading in recent_readings) / 5, 2)
 
             if avg_overall_aqi > 200 and can_send_alert("aqi_high"):
-                send_high_alert_to_slack(avg_overall_aqi, avg_pm2_5_raw, avg_pm10_raw)
+                await asyncio.to_thread(send_high_alert_to_slack, avg_overall_aqi, avg_pm2_5_raw, avg_pm10_raw)
             elif can_send_alert("aqi_info"):
-                send_info_alert_to_slack(avg_overall_aqi, avg_pm2_5_raw, avg_pm10_raw)
+                await asyncio.to_thread(send_info_alert_to_slack, avg_overall_aqi, avg_pm2_5_raw, avg_pm10_raw)
 
         # Calculate average VOC if there are enough readings
         if len(recent_voc_readings) == 5:
             avg_voc = round(sum(reading.voc for reading in recent_voc_readings) / 5, 2)
 
             if avg_voc >= 3 and can_send_alert("voc_high"):
-                send_voc_alert_to_slack(avg_voc, "high")
+                await asyncio.to_thread(send_voc_alert_to_slack, avg_voc, "high")
             elif avg_voc >= 2 and can_send_alert("voc_warning"):
-                send_voc_alert_to_slack(avg_voc, "warning")
+                await asyncio.to_thread(send_voc_alert_to_slack, avg_voc, "warning")
             elif avg_voc >= 1 and can_send_alert("voc_info"):
-                send_voc_alert_to_slack(avg_voc, "info")
+                await asyncio.to_thread(send_voc_alert_to_slack, avg_voc, "info")
     
     except Exception as e:
         print(f"Error in monitoring AQI and VOC data: {e}")
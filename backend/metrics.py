@@ -0,0 +1,123 @@
+# metrics.py
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# In-process counters, gauges and histograms, keyed by (name, sorted label pairs)
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_histograms = {}
+
+# Histogram bucket upper bounds: durations in seconds, and row counts
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+ROW_BUCKETS = (1, 10, 100, 500, 1000, 5000, 10000, 50000)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)  # per bucket, not cumulative
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+def increment(name: str, value: float = 1, **labels):
+    """Add `value` to a counter, e.g. increment("batch_writer_dropped_total", writer="request_logs")."""
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels):
+    """Set a gauge to its current value."""
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name: str, value: float, buckets=SECONDS_BUCKETS, **labels):
+    """Record one observation in a histogram, e.g. observe("db_query_seconds", 0.003, engine="async")."""
+    with _lock:
+        histogram = _histograms.get(_key(name, labels))
+        if histogram is None:
+            histogram = _histograms[_key(name, labels)] = _Histogram(buckets)
+        histogram.observe(value)
+
+
+@contextmanager
+def timed(name: str, **labels):
+    """Observe the duration of the block in the histogram `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+async def watch_event_loop(interval: float = 0.5):
+    """Record how late the event loop wakes up; blocking work on the loop shows up as lag."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        observe("event_loop_lag_seconds", max(loop.time() - start - interval, 0.0))
+
+
+def snapshot():
+    """Return all counters, gauges and histograms as {"counters": [...], "gauges": [...], "histograms": [...]}."""
+    with _lock:
+        def rows(values):
+            return [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in values.items()]
+        histograms = [
+            {"name": name, "labels": dict(labels), "buckets": dict(zip(h.buckets, h.counts)), "sum": h.sum, "count": h.count}
+            for (name, labels), h in _histograms.items()
+        ]
+        return {"counters": rows(_counters), "gauges": rows(_gauges), "histograms": histograms}
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    with _lock:
+        for kind, values in (("counter", _counters), ("gauge", _gauges)):
+            typed = set()
+            for (name, labels), value in sorted(values.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} {kind}")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        typed = set()
+        for (name, labels), h in sorted(_histograms.items(), key=lambda item: item[0]):
+            if name not in typed:
+                lines.append(f"# TYPE {name} histogram")
+                typed.add(name)
+            cumulative = 0
+            for bound, count in zip(h.buckets, h.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {h.count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+            lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+    return "\n".join(lines) + "\n"
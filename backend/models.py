@@ -1,5 +1,6 @@
 # models.py
 from sqlalchemy import Column, Integer, Float, TIMESTAMP, String, DateTime, JSON
+from sqlalchemy.orm import declarative_base
 from datetime import datetime
 from db import Base
 
@@ -14,6 +15,12 @@ class AQIReading(Base):
     aqi_pm25 = Column(Integer, nullable=False)
     aqi_pm10 = Column(Integer, nullable=False)
     overall_aqi = Column(Integer, nullable=False)
+    # Set when the row is the mean of a window of readings (collector's continuous sampling mode)
+    pm25_min = Column(Float, nullable=True)
+    pm25_max = Column(Float, nullable=True)
+    pm10_min = Column(Float, nullable=True)
+    pm10_max = Column(Float, nullable=True)
+    sample_count = Column(Integer, nullable=True)
 
 
 class RequestLog(Base):
@@ -59,6 +66,18 @@ class ZPHS01BReading(Base):
     aqi_o3 = Column(Integer, nullable=True)  # Nullable, if applicable
     aqi_no2 = Column(Integer, nullable=True)  # Nullable, if applicable
     overall_aqi = Column(Integer, nullable=False)
+    # Set when the row is the mean of a window of readings (collector's continuous sampling mode)
+    pm1_0_min = Column(Float, nullable=True)
+    pm1_0_max = Column(Float, nullable=True)
+    pm2_5_min = Column(Float, nullable=True)
+    pm2_5_max = Column(Float, nullable=True)
+    pm10_min = Column(Float, nullable=True)
+    pm10_max = Column(Float, nullable=True)
+    co2_min = Column(Float, nullable=True)
+    co2_max = Column(Float, nullable=True)
+    voc_min = Column(Integer, nullable=True)
+    voc_max = Column(Integer, nullable=True)
+    sample_count = Column(Integer, nullable=True)
     
 class WeatherData(Base):
     __tablename__ = "weather_data"
@@ -73,4 +92,35 @@ class WeatherData(Base):
     rain_intensity = Column(Float, nullable=True)
     rain_accumulation = Column(Float, nullable=True)
     city_name = Column(String(255), nullable=True)
-    locality_name = Column(String(255), nullable=True)
\ No newline at end of file
+    locality_name = Column(String(255), nullable=True)
+
+
+# Rollup tables are created by the data-collector migrations together with the triggers that
+# keep them up to date, so they use their own metadata and are never created by create_all().
+RollupBase = declarative_base()
+
+AQI_ROLLUP_FIELDS = ["pm25", "pm10", "aqi_pm25", "aqi_pm10", "overall_aqi"]
+ZPHS01B_ROLLUP_FIELDS = [
+    "pm1_0", "pm2_5", "pm10", "co2", "voc", "temperature", "humidity",
+    "ch2o", "co", "o3", "no2", "overall_aqi",
+]
+
+def rollup_model(class_name, table_name, fields):
+    """Build a model for a rollup table holding sum/min/max of each field per time bucket."""
+    attributes = {
+        "__tablename__": table_name,
+        "__table_args__": {"schema": "aqi_data"},
+        "bucket": Column(TIMESTAMP, primary_key=True),  # Start of the bucket
+        "sample_count": Column(Integer, nullable=False),  # Raw readings in the bucket
+    }
+    for field in fields:
+        for suffix in ("sum", "min", "max"):
+            attributes[f"{field}_{suffix}"] = Column(Float, nullable=False)
+    return type(class_name, (RollupBase,), attributes)
+
+AQIReadingRollup1m = rollup_model("AQIReadingRollup1m", "aqi_readings_1m", AQI_ROLLUP_FIELDS)
+AQIReadingRollup1h = rollup_model("AQIReadingRollup1h", "aqi_readings_1h", AQI_ROLLUP_FIELDS)
+AQIReadingRollup1d = rollup_model("AQIReadingRollup1d", "aqi_readings_1d", AQI_ROLLUP_FIELDS)
+ZPHS01BReadingRollup1m = rollup_model("ZPHS01BReadingRollup1m", "zphs01b_readings_1m", ZPHS01B_ROLLUP_FIELDS)
+ZPHS01BReadingRollup1h = rollup_model("ZPHS01BReadingRollup1h", "zphs01b_readings_1h", ZPHS01B_ROLLUP_FIELDS)
+ZPHS01BReadingRollup1d = rollup_model("ZPHS01BReadingRollup1d", "zphs01b_readings_1d", ZPHS01B_ROLLUP_FIELDS)
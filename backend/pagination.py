@@ -0,0 +1,47 @@
+# pagination.py
+import base64
+from datetime import datetime
+from typing import Optional, Sequence, Tuple
+from sqlalchemy import tuple_
+from queries import naive_utc
+
+# Response header carrying the cursor of the next page (absent on the last page)
+CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Encode the (timestamp, id) of the last row of a page as an opaque URL-safe token."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a token produced by encode_cursor(). Raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def apply_cursor(stmt, model, cursor: Optional[str]):
+    """
+    Order readings newest first and, when a cursor is given, start right after it.
+
+    Seeking on (timestamp, id) instead of OFFSET lets the database start reading at the cursor,
+    so every page costs the same no matter how deep it is.
+    """
+    stmt = stmt.order_by(model.timestamp.desc(), model.id.desc())
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(model.timestamp, model.id) < tuple_(naive_utc(timestamp), row_id))
+    return stmt
+
+
+def next_cursor(rows: Sequence, limit: Optional[int]) -> Optional[str]:
+    """Return the cursor for the page after `rows`, or None if this was the last page."""
+    if not limit or len(rows) < limit:
+        return None
+    last = rows[-1]
+    return encode_cursor(last.timestamp, last.id)
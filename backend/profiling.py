@@ -0,0 +1,149 @@
+# profiling.py
+import asyncio
+import logging
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this are logged with their EXPLAIN ANALYZE plan (0 disables)
+SLOW_QUERY_MS = float(os.getenv("PROFILE_SLOW_QUERY_MS", "500"))
+
+# Fraction of slow statements explained outside profiled requests; EXPLAIN ANALYZE runs the query again
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("PROFILE_SLOW_QUERY_SAMPLE_RATE", "0.05"))
+
+# Plans waiting to be explained; slow statements beyond this are only counted
+EXPLAIN_QUEUE_SIZE = 10
+
+# Span name -> [seconds, count] for the current profiled request, None when not profiling
+_spans: ContextVar[Optional[dict]] = ContextVar("profile_spans", default=None)
+
+
+def start():
+    """Start collecting spans for the current request; pass the token to stop()."""
+    return _spans.set({})
+
+
+def stop(token) -> dict:
+    """Stop collecting and return the spans recorded since start()."""
+    spans = _spans.get()
+    _spans.reset(token)
+    return spans
+
+
+def active() -> bool:
+    return _spans.get() is not None
+
+
+def add(name: str, seconds: float):
+    """Add time to a span of the current profiled request (no-op otherwise)."""
+    spans = _spans.get()
+    if spans is not None:
+        entry = spans.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+@contextmanager
+def span(name: str):
+    """Time the block as part of span `name` when the current request is profiled."""
+    if _spans.get() is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(name, time.perf_counter() - start_time)
+
+
+def server_timing(spans: dict, total: float) -> str:
+    """Format spans as a Server-Timing header value (durations in milliseconds)."""
+    entries = [f'{name};dur={seconds * 1000:.1f};desc="{count}x"' for name, (seconds, count) in spans.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class SlowQueryLog:
+    """
+    Log statements slower than SLOW_QUERY_MS with their EXPLAIN ANALYZE plan.
+
+    Statements of profiled requests are always explained, others at SLOW_QUERY_SAMPLE_RATE.
+    Only plain SELECTs are explained, since EXPLAIN ANALYZE executes the statement again; that
+    happens in a background task on a separate connection, after the request has its result.
+    """
+
+    def __init__(self):
+        self.queue = None
+        self.loop = None
+        self._task = None
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=EXPLAIN_QUEUE_SIZE)
+        self.loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def finished(self, engine: str, statement: str, parameters, executemany: bool, seconds: float):
+        """Called after every statement; picks slow SELECTs to explain. Safe from any thread."""
+        if self._task is None or not SLOW_QUERY_MS or seconds * 1000 < SLOW_QUERY_MS:
+            return
+        keyword = statement.split(None, 1)[0].upper() if statement.strip() else ""
+        if keyword == "EXPLAIN":
+            return  # Our own EXPLAIN ANALYZE
+        metrics.increment("db_slow_queries_total", engine=engine)
+        if executemany or keyword != "SELECT":
+            logger.warning(f"Slow statement ({seconds * 1000:.0f} ms on {engine}): {statement}")
+            return
+        if not active() and random.random() >= SLOW_QUERY_SAMPLE_RATE:
+            return
+        self.loop.call_soon_threadsafe(self._enqueue, (engine, statement, parameters, seconds))
+
+    def _enqueue(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            pass
+
+    async def _run(self):
+        while True:
+            engine, statement, parameters, seconds = await self.queue.get()
+            try:
+                plan = await self._explain(engine, statement, parameters)
+                logger.warning(
+                    f"Slow query ({seconds * 1000:.0f} ms on {engine}):\n{statement}\n"
+                    f"parameters: {parameters!r}\n{plan}"
+                )
+            except Exception as e:
+                logger.warning(f"Slow query ({seconds * 1000:.0f} ms on {engine}), EXPLAIN failed: {e}\n{statement}")
+
+    async def _explain(self, engine: str, statement: str, parameters) -> str:
+        from db import async_engine, engine as sync_engine
+
+        explain = "EXPLAIN (ANALYZE, BUFFERS) " + statement
+        if engine == "async":
+            async with async_engine.connect() as connection:
+                rows = (await connection.exec_driver_sql(explain, parameters)).all()
+        else:
+            def run():
+                with sync_engine.connect() as connection:
+                    return connection.exec_driver_sql(explain, parameters).all()
+            rows = await asyncio.to_thread(run)
+        return "\n".join(row[0] for row in rows)
+
+
+slow_query_log = SlowQueryLog()
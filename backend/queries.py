@@ -0,0 +1,53 @@
+# queries.py
+from datetime import datetime, timezone
+from typing import List, Optional, get_args
+from sqlalchemy import Float, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """
+    Convert an aware datetime to naive UTC, the form timestamp parameters are bound in.
+
+    The models declare naive TIMESTAMP columns; asyncpg refuses aware values for them instead of
+    letting Postgres convert, so query parameters from clients are normalized first.
+    """
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def apply_time_range(stmt, model, start_time: Optional[datetime], end_time: Optional[datetime]):
+    """Restrict a query or select statement to readings between start_time and end_time (inclusive)."""
+    if start_time:
+        stmt = stmt.where(model.timestamp >= naive_utc(start_time))
+    if end_time:
+        stmt = stmt.where(model.timestamp <= naive_utc(end_time))
+    return stmt
+
+
+def latest_timestamp(db: Session, model) -> Optional[datetime]:
+    """Return the timestamp of the newest row in the model's table, or None if it is empty."""
+    return db.execute(select(func.max(model.timestamp))).scalar()
+
+
+async def fetch_latest_timestamp(db: AsyncSession, model) -> Optional[datetime]:
+    """latest_timestamp() for an AsyncSession."""
+    return (await db.execute(select(func.max(model.timestamp)))).scalar()
+
+
+def schema_columns(model, schema) -> List:
+    """
+    Columns of `model` for each field of the response `schema`, in schema order.
+
+    Integer columns behind float fields are cast in SQL, so rows selected with these columns
+    serialize exactly like the Pydantic model would without being validated row by row.
+    """
+    columns = []
+    for name, field in schema.model_fields.items():
+        column = getattr(model, name)
+        if float in (field.annotation, *get_args(field.annotation)) and not isinstance(column.type, Float):
+            column = cast(column, Float).label(name)
+        columns.append(column)
+    return columns
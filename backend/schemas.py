@@ -10,6 +10,12 @@ class AQIReadingResponse(BaseModel):
     aqi_pm25    : float
     aqi_pm10    : float
     overall_aqi : float
+    # Window min/max and number of readings averaged, when sampled continuously
+    pm25_min    : Optional[float] = None
+    pm25_max    : Optional[float] = None
+    pm10_min    : Optional[float] = None
+    pm10_max    : Optional[float] = None
+    sample_count: Optional[int] = None
 
     class Config:
         from_attributes = True  # Updated for Pydantic v2
@@ -41,6 +47,18 @@ class ZPHS01BReadingResponse(BaseModel):
     aqi_o3: Optional[float] = None
     aqi_no2: Optional[float] = None
     overall_aqi: float
+    # Window min/max and number of readings averaged, when sampled continuously
+    pm1_0_min: Optional[float] = None
+    pm1_0_max: Optional[float] = None
+    pm2_5_min: Optional[float] = None
+    pm2_5_max: Optional[float] = None
+    pm10_min: Optional[float] = None
+    pm10_max: Optional[float] = None
+    co2_min: Optional[float] = None
+    co2_max: Optional[float] = None
+    voc_min: Optional[int] = None
+    voc_max: Optional[int] = None
+    sample_count: Optional[int] = None
 
     class Config:
         from_attributes = True  # Updated for Pydantic v2
@@ -57,4 +75,9 @@ class WeatherDataResponse(BaseModel):
     locality_name: Optional[str] = None
 
     class Config:
-        from_attributes = True  # Updated for Pydantic v2
\ No newline at end of file
+        from_attributes = True  # Updated for Pydantic v2
+
+class AggregateBucketResponse(BaseModel):
+    bucket: datetime  # Start of the bucket
+    count: int  # Number of raw readings in the bucket
+    values: Dict[str, Dict[str, Optional[float]]]  # field -> aggregate -> value
\ No newline at end of file
@@ -0,0 +1,108 @@
+# serialization.py
+import csv
+import io
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+import orjson
+
+# Response formats of the reading endpoints and their media types. "json" is the default list
+# of row objects; the others are column-oriented: one array per field, keys written once.
+MEDIA_TYPES = {
+    "json": "application/json",
+    "columnar": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "msgpack": "application/msgpack",
+}
+
+# Accept header values that select a format when no ?format= is given
+ACCEPT_FORMATS = {
+    "application/vnd.apache.arrow.stream": "arrow",
+    "application/msgpack": "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+
+
+# UTC timestamps end in "Z" and naive ones carry no offset, as in Pydantic's JSON output
+JSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+class FormatUnavailable(Exception):
+    """Raised when the library needed for a format is not installed."""
+
+
+def negotiate(format: Optional[str], accept: Optional[str]) -> str:
+    """Pick the response format: an explicit ?format= wins, then the Accept header, then json."""
+    if format:
+        return format
+    for media_range in (accept or "").split(","):
+        fmt = ACCEPT_FORMATS.get(media_range.split(";")[0].strip().lower())
+        if fmt:
+            return fmt
+    return "json"
+
+
+def dumps_row(fields: List[str], row: Sequence) -> bytes:
+    """Encode one selected row as a JSON object. Values past the last field (e.g. id) are left out."""
+    return orjson.dumps(dict(zip(fields, row)), option=JSON_OPTIONS)
+
+
+def dumps_rows(fields: List[str], rows: Sequence[Sequence]) -> bytes:
+    """Encode selected rows as a JSON list of objects in one orjson call."""
+    return orjson.dumps([dict(zip(fields, row)) for row in rows], option=JSON_OPTIONS)
+
+
+def ndjson_chunk(fields: List[str], rows: Sequence[Sequence]) -> bytes:
+    """Encode selected rows as newline-delimited JSON, one object per line."""
+    return b"".join(orjson.dumps(dict(zip(fields, row)), option=JSON_OPTIONS) + b"\n" for row in rows)
+
+
+def csv_chunk(rows: Sequence[Sequence], width: int) -> bytes:
+    """Encode the first `width` values of each row as CSV lines (timestamps in ISO 8601)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([_isoformat(v) if isinstance(v, datetime) else v for v in row[:width]] for row in rows)
+    return buffer.getvalue().encode()
+
+
+def to_columns(rows, fields: List[str]) -> Dict[str, list]:
+    """Turn rows (selected tuples or dicts) into {field: [values...]}."""
+    if rows and isinstance(rows[0], dict):
+        return {field: [row[field] for row in rows] for field in fields}
+    return {field: list(values) for field, values in zip(fields, zip(*rows))}
+
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def serialize_columns(columns: Dict[str, list], fmt: str) -> bytes:
+    """Encode {field: [values...]} as columnar JSON, an Arrow IPC stream or msgpack."""
+    if fmt == "columnar":
+        return orjson.dumps(columns, option=JSON_OPTIONS)
+
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError:
+            raise FormatUnavailable("msgpack format requires the msgpack package")
+        return msgpack.packb(columns, default=_isoformat)
+
+    if fmt == "arrow":
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise FormatUnavailable("arrow format requires the pyarrow package")
+        # Timestamps from the ring buffer are ISO strings; Arrow gets a native timestamp column
+        columns = {
+            field: [datetime.fromisoformat(v) if isinstance(v, str) else v for v in values] if field == "timestamp" else values
+            for field, values in columns.items()
+        }
+        table = pa.table(columns)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    raise ValueError(f"Unknown format {fmt!r}")
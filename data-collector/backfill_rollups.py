@@ -0,0 +1,56 @@
+# backfill_rollups.py
+"""
+Rebuild the 1m/1h/1d rollup tables from the raw reading tables.
+
+Migration 03fbcfa05c5b fills the rollups from the existing rows and its triggers fold in new ones,
+so this is only needed after editing raw rows by hand, or once on a database that was upgraded past
+that migration before it did the initial fill.
+
+    python backfill_rollups.py                          # everything, local database
+    python backfill_rollups.py --since 2024-11-01       # only buckets from this date
+    python backfill_rollups.py --dsn "$REMOTE_RDS_DB"   # another database, e.g. the cloud copy
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+import psycopg2
+from db import get_db_connection
+
+
+def backfill(connection, since):
+    """Recompute every rollup bucket starting at `since` (None rebuilds everything)."""
+    cursor = connection.cursor()
+    try:
+        if since is None:
+            cursor.execute("SELECT aqi_data.refresh_rollups()")
+        else:
+            cursor.execute("SELECT aqi_data.refresh_rollups(%s)", (since,))
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild reading rollup tables from raw rows.")
+    parser.add_argument("--since", type=datetime.fromisoformat, default=None,
+                        help="Only rebuild buckets from this timestamp (ISO format)")
+    parser.add_argument("--dsn", default=None,
+                        help="Connection string of the database to backfill (defaults to db.DB_CONFIG)")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.dsn) if args.dsn else get_db_connection()
+    if connection is None:
+        print("Failed to connect to the database.")
+        sys.exit(1)
+
+    started = time.monotonic()
+    try:
+        backfill(connection, args.since)
+    finally:
+        connection.close()
+    print(f"Rollups rebuilt from {args.since or 'the first reading'} in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 # db.py
 
+import os
 import sys
+import threading
+import time
 import psycopg2
+from psycopg2.extras import execute_values
 from alembic import command
 from alembic.config import Config
 from datetime import datetime
+from spool import Spool
 
 # Database configuration
 DB_CONFIG = {
@@ -27,6 +32,284 @@ def get_db_connection():
         print(f"Error connecting to database: {e}")
         return None
 
+# Tables written by the collector and their columns, by insert statement name.
+# The first column is always the reading's timestamp, which is unique per table.
+INSERT_TABLES = {
+    "insert_aqi_reading": ("aqi_data.aqi_readings", [
+        "timestamp", "pm25", "pm10", "aqi_pm25", "aqi_pm10", "overall_aqi",
+        "pm25_min", "pm25_max", "pm10_min", "pm10_max", "sample_count",
+    ]),
+    "insert_zphs01b_reading": ("aqi_data.zphs01b_readings", [
+        "timestamp", "pm1_0", "pm2_5", "pm10", "co2", "voc", "temperature", "humidity", "ch2o", "co", "o3", "no2",
+        "aqi_pm2_5", "aqi_pm10", "aqi_co", "aqi_o3", "aqi_no2", "overall_aqi",
+        "pm1_0_min", "pm1_0_max", "pm2_5_min", "pm2_5_max", "pm10_min", "pm10_max",
+        "co2_min", "co2_max", "voc_min", "voc_max", "sample_count",
+    ]),
+    "insert_weather_reading": ("aqi_data.weather_data", [
+        "timestamp", "temperature", "humidity", "wind_speed", "wind_direction",
+        "rain_intensity", "rain_accumulation", "city_name", "locality_name",
+    ]),
+}
+
+# Attempts per insert when the connection is lost, and seconds between them
+INSERT_ATTEMPTS = 3
+RECONNECT_DELAY = 2
+
+# Errors that mean Postgres could not be reached, as opposed to a rejected row
+CONNECTION_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError)
+
+
+class InsertConnection:
+    """
+    One long-lived connection shared by the insert functions, instead of a new connection per row.
+
+    The inserts are PREPAREd once per connection. A lock serializes the sensor threads, which
+    insert a row every few seconds at most, so a single connection is all the pool they need.
+    When the connection is lost it is reopened and the insert retried.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        connection = psycopg2.connect(**DB_CONFIG)
+        try:
+            cursor = connection.cursor()
+            for name, (table, columns) in self.tables.items():
+                placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+                cursor.execute(
+                    f"PREPARE {name} AS INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+                    "ON CONFLICT (timestamp) DO NOTHING"
+                )
+            connection.commit()
+            cursor.close()
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _discard(self):
+        if self.connection is None:
+            return  # The connect itself failed
+        try:
+            self.connection.close()
+        except psycopg2.Error:
+            pass
+        self.connection = None
+
+    def _run(self, work):
+        """Call work(cursor) in a transaction and commit, reconnecting and retrying if the connection is lost."""
+        with self.lock:
+            for attempt in range(1, INSERT_ATTEMPTS + 1):
+                try:
+                    if self.connection is None:
+                        self.connection = self._connect()
+                    cursor = self.connection.cursor()
+                    try:
+                        work(cursor)
+                    finally:
+                        cursor.close()
+                    self.connection.commit()
+                    return
+                except CONNECTION_ERRORS as e:
+                    # Server restarted or network dropped: nothing was committed, try again
+                    self._discard()
+                    if attempt == INSERT_ATTEMPTS:
+                        raise
+                    print(f"Database connection lost ({e}), reconnecting in {RECONNECT_DELAY}s...")
+                    time.sleep(RECONNECT_DELAY)
+                except Exception:
+                    if self.connection is not None:
+                        self.connection.rollback()
+                    raise
+
+    def execute(self, name, params):
+        """Run prepared insert `name` with `params`; a row whose timestamp is already stored is skipped."""
+        placeholders = ", ".join(["%s"] * len(params))
+        self._run(lambda cursor: cursor.execute(f"EXECUTE {name} ({placeholders})", params))
+
+    def execute_values(self, rows):
+        """
+        Insert {statement name: [params, ...]} with one multi-row INSERT per table, in a single
+        transaction. Rows whose timestamp is already stored are skipped, so a batch can be replayed.
+        """
+        def work(cursor):
+            for name, params in rows.items():
+                table, columns = self.tables[name]
+                execute_values(
+                    cursor,
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s ON CONFLICT (timestamp) DO NOTHING",
+                    params,
+                    page_size=len(params),
+                )
+        self._run(work)
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self._discard()
+
+
+insert_connection = InsertConnection(INSERT_TABLES)
+
+# Readings that could not be written are kept here until Postgres is reachable again
+SPOOL_PATH = os.getenv("SPOOL_PATH", "spool.sqlite3")
+SPOOL_MAX_ROWS = int(os.getenv("SPOOL_MAX_ROWS", "200000"))
+
+# Spooled readings written per multi-row INSERT when draining
+SPOOL_DRAIN_BATCH = 500
+
+_spool = None
+_spool_lock = threading.Lock()
+_drain_lock = threading.Lock()
+
+def get_spool():
+    """Open the spool on first use, so scripts that only import get_db_connection never create it."""
+    global _spool
+    with _spool_lock:
+        if _spool is None:
+            _spool = Spool(SPOOL_PATH, SPOOL_MAX_ROWS)
+        return _spool
+
+def write_batch(items):
+    """
+    Write [(key, statement name, params)] with one multi-row INSERT per table, in one transaction.
+
+    If Postgres rejects the batch, the rows are written one by one and the rejected ones dropped,
+    so a single bad reading cannot hold up the rest. Returns the keys of the rows that are done
+    (written or dropped), which is fewer than given when the connection was lost.
+    """
+    # Readings spooled by an older collector lack the columns added since; those are NULL
+    items = [(key, name, tuple(params) + (None,) * (len(INSERT_TABLES[name][1]) - len(params))) for key, name, params in items]
+    rows = {}
+    for _, name, params in items:
+        rows.setdefault(name, []).append(params)
+    try:
+        if len(items) == 1:
+            insert_connection.execute(items[0][1], items[0][2])
+        else:
+            insert_connection.execute_values(rows)
+        return [key for key, _, _ in items]
+    except CONNECTION_ERRORS as e:
+        print(f"Database unavailable: {e}")
+        return []
+    except psycopg2.Error as e:
+        print(f"Batch rejected ({e}), writing it row by row")
+
+    done = []
+    for key, name, params in items:
+        try:
+            insert_connection.execute(name, params)
+        except CONNECTION_ERRORS:
+            break
+        except psycopg2.Error as e:
+            print(f"Dropping reading {params}: {e}")
+        done.append(key)
+    return done
+
+def drain_spool(limit=None):
+    """Write spooled readings to Postgres in multi-row batches, oldest first; at most `limit` if given."""
+    if not _drain_lock.acquire(blocking=False):
+        return  # Another thread is already draining
+    try:
+        spool = get_spool()
+        remaining = limit
+        while spool.pending() and remaining != 0:
+            batch = spool.take(SPOOL_DRAIN_BATCH if remaining is None else min(SPOOL_DRAIN_BATCH, remaining))
+            if remaining is not None:
+                remaining -= len(batch)
+            done = write_batch(batch)
+            spool.remove(done)
+            if len(done) < len(batch):
+                print(f"{spool.pending()} spooled readings kept until the database is back")
+                return
+            print(f"Wrote {len(batch)} spooled readings, {spool.pending()} left")
+    finally:
+        _drain_lock.release()
+
+# Readings are written once this many are waiting, or when the oldest has waited this many seconds
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "100"))
+WRITE_BATCH_SECONDS = float(os.getenv("WRITE_BATCH_SECONDS", "5"))
+
+
+class BatchWriter:
+    """
+    Collect readings from the sampling threads and write them from a background thread in
+    multi-row batches, so each sample costs an append instead of a transaction.
+
+    A batch that cannot be written because Postgres is unreachable goes to the spool. Each
+    successful write is followed by one batch of spooled readings, so a long backlog drains
+    without holding up the new readings.
+    """
+
+    def __init__(self, max_rows, max_delay):
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.rows = []
+        self.first_added = None
+        self.stopping = False
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def start(self):
+        with self.condition:
+            if self.thread is None:
+                self.stopping = False
+                self.thread = threading.Thread(target=self._run, name="batch-writer", daemon=True)
+                self.thread.start()
+
+    def add(self, name, params):
+        """Queue one reading (timestamp first) for insert statement `name`."""
+        self.start()
+        with self.condition:
+            if not self.rows:
+                self.first_added = time.monotonic()
+            self.rows.append((name, params))
+            if len(self.rows) == 1 or len(self.rows) >= self.max_rows:
+                self.condition.notify()  # Start the flush timer, or flush now
+
+    def stop(self):
+        """Write the readings still waiting and stop the background thread."""
+        with self.condition:
+            thread = self.thread
+            self.stopping = True
+            self.condition.notify()
+        if thread is not None:
+            thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.rows or self.stopping)
+                deadline = self.first_added + self.max_delay if self.rows else time.monotonic()
+                self.condition.wait_for(
+                    lambda: len(self.rows) >= self.max_rows or self.stopping,
+                    timeout=max(deadline - time.monotonic(), 0),
+                )
+                batch, self.rows = self.rows, []
+                stopping = self.stopping
+            if batch:
+                self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        spool = get_spool()
+        done = set(write_batch([(i, name, params) for i, (name, params) in enumerate(batch)]))
+        failed = [(name, params) for i, (name, params) in enumerate(batch) if i not in done]
+        for name, params in failed:
+            spool.append(name, params[0], params[1:])
+        if failed:
+            print(f"Spooled {len(failed)} readings ({spool.pending()} waiting)")
+        elif spool.pending():
+            drain_spool(self.max_rows)
+
+
+batch_writer = BatchWriter(WRITE_BATCH_SIZE, WRITE_BATCH_SECONDS)
+
 def apply_migrations():
     """Apply all migrations using Alembic."""
     alembic_cfg = Config("alembic.ini")
@@ -52,94 +335,62 @@ def apply_migrations():
         print("Migration was applied, but table does not exist.")
         sys.exit(1)
 
-def insert_aqi_data(pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi):
-    """Insert AQI data into the aqi_data.aqi_readings table."""
-    connection = get_db_connection()
-    if connection is None:
-        print("Failed to connect to the database.")
-        return
+def insert_aqi_data(pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi, window=None):
+    """Queue AQI data for the aqi_data.aqi_readings table.
 
+    `window` holds pm25_min/_max, pm10_min/_max and sample_count when the values are the mean
+    of a window of readings (continuous sampling mode).
+    The rollup trigger folds the row into aqi_readings_1m/_1h/_1d in the same transaction.
+    """
     try:
-        cursor = connection.cursor()
-
-        # SQL query to insert AQI data into the schema-specific table
-        insert_query = """
-        INSERT INTO aqi_data.aqi_readings (timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """
         timestamp = datetime.now()
-        cursor.execute(insert_query, (timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi))
-        connection.commit()
-
-        print(f"Data inserted at {timestamp}: PM2.5={pm25}, PM10={pm10}, AQI (PM2.5)={aqi_pm25}, AQI (PM10)={aqi_pm10}, Overall AQI={overall_aqi}")
+        window = window or {}
+        batch_writer.add("insert_aqi_reading", (
+            timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi,
+            window.get('pm25_min'), window.get('pm25_max'), window.get('pm10_min'), window.get('pm10_max'),
+            window.get('sample_count')
+        ))
+        print(f"Data queued at {timestamp}: PM2.5={pm25}, PM10={pm10}, AQI (PM2.5)={aqi_pm25}, AQI (PM10)={aqi_pm10}, Overall AQI={overall_aqi}")
 
     except Exception as e:
         print(f"Error inserting data: {e}")
-    finally:
-        cursor.close()
-        connection.close()
 
 def insert_zphs01b_data(data):
-    """Insert ZPHS01B sensor data into the aqi_data.zphs01b_readings table."""
-    connection = get_db_connection()
-    if connection is None:
-        print("Failed to connect to the database.")
-        return
+    """Queue ZPHS01B sensor data for the aqi_data.zphs01b_readings table.
 
+    In continuous sampling mode `data` also holds the window's min/max (e.g. 'pm2.5_min') and
+    sample_count.
+    The rollup trigger folds the row into zphs01b_readings_1m/_1h/_1d in the same transaction.
+    """
     try:
-        cursor = connection.cursor()
-        # SQL query to insert data into the ZPHS01B-specific table
-        insert_query = """
-        INSERT INTO aqi_data.zphs01b_readings (
-            timestamp, pm1_0, pm2_5, pm10, co2, voc, temperature, humidity, ch2o, co, o3, no2,
-            aqi_pm2_5, aqi_pm10, aqi_co, aqi_o3, aqi_no2, overall_aqi
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
         timestamp = datetime.now()
-        cursor.execute(insert_query, (
+        batch_writer.add("insert_zphs01b_reading", (
             timestamp, data['pm1.0'], data['pm2.5'], data['pm10'], data['co2'], data['voc'],
             data['temperature'], data['humidity'], data['ch2o'], data['co'], data['o3'], data['no2'],
             data['aqi_pm2.5'], data['aqi_pm10'], data.get('aqi_co'), data.get('aqi_o3'), data.get('aqi_no2'),
-            data['overall_aqi']
+            data['overall_aqi'],
+            data.get('pm1.0_min'), data.get('pm1.0_max'), data.get('pm2.5_min'), data.get('pm2.5_max'),
+            data.get('pm10_min'), data.get('pm10_max'), data.get('co2_min'), data.get('co2_max'),
+            data.get('voc_min'), data.get('voc_max'), data.get('sample_count')
         ))
-        connection.commit()
-        print(f"Data inserted at {timestamp}: {data}")
+        print(f"Data queued at {timestamp}: {data}")
 
     except Exception as e:
         print(f"Error inserting data: {e}")
-    finally:
-        cursor.close()
-        connection.close()
         
 
 # Insert weather data into the new table
 def insert_weather_data(data):
-    """Insert weather data into the weather_data table with hardcoded city and locality."""
-    connection = get_db_connection()
-    if connection is None:
-        print("Failed to connect to the database.")
-        return
-
+    """Queue weather data for the weather_data table with hardcoded city and locality."""
     try:
-        cursor = connection.cursor()
-        insert_query = """
-        INSERT INTO aqi_data.weather_data (
-            timestamp, temperature, humidity, wind_speed, wind_direction,
-            rain_intensity, rain_accumulation, city_name, locality_name
-        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """
         timestamp = datetime.now()
-        cursor.execute(insert_query, (
+        batch_writer.add("insert_weather_reading", (
             timestamp, data.get('temperature'), data.get('humidity'),
             data.get('wind_speed'), data.get('wind_direction'),
             data.get('rain_intensity'), data.get('rain_accumulation'),
             'Hyderabad', 'Patancheru, Hyderabad'  # Hardcoded values for city_name and locality_name
         ))
-        connection.commit()
-        print(f"Weather data inserted at {timestamp}: {data}")
+        print(f"Weather data queued at {timestamp}: {data}")
 
     except Exception as e:
         print(f"Error inserting weather data: {e}")
-    finally:
-        cursor.close()
-        connection.close()
\ No newline at end of file
@@ -1,5 +1,8 @@
 # main.py
-from db import apply_migrations, insert_aqi_data, insert_zphs01b_data, insert_weather_data
+from db import apply_migrations, get_db_connection, insert_aqi_data, insert_zphs01b_data, insert_weather_data, insert_connection, drain_spool, batch_writer
+from partitions import ensure_partitions
+import asyncio
+import os
 import time
 from sds011 import SDS011
 from zpsh01_sensor import ZPHS01B
@@ -118,6 +121,9 @@ tokens = [
 # Index to keep track of the current token
 current_token_index = 0
 
+# Seconds to wait for the weather API before giving up on this sample
+WEATHER_TIMEOUT = 10
+
 def fetch_weather_data():
     global current_token_index
     
@@ -127,7 +133,7 @@ def fetch_weather_data():
         'Content-Type': 'application/json',
     }
 
-    response = requests.get(url, headers=headers)
+    response = requests.get(url, headers=headers, timeout=WEATHER_TIMEOUT)
     
     # Update the token index to use the next one in the list
     current_token_index = (current_token_index + 1) % len(tokens)
@@ -156,34 +162,28 @@ def get_zpsh01_sensor_data():
     zpsh01_sensor.stop_measurement()
     return result
 
-def main():
-    """Main function to fetch AQI data and insert into database."""
+def read_sds011():
+    """Query the running SDS011 sensor once (continuous mode)."""
+    pm25, pm10 = sensor.query()
+    return {"pm25": pm25, "pm10": pm10}
 
-    # Apply migrations on startup
-    apply_migrations()
+def store_sds011_reading(pm25, pm10, window=None):
+    """Insert an SDS011 reading, or the mean of a window of readings, with its AQI."""
+    aqi_pm25 = get_aqi(pm25, "PM2.5")
+    aqi_pm10 = get_aqi(pm10, "PM10")
+    overall_aqi = max(aqi_pm25, aqi_pm10)
 
-    try:
-        while True:
-            # Fetch weather data from API
-            weather_data = fetch_weather_data()
-            
-            insert_weather_data(weather_data)
-            process_zpsh01_sensor()
-            pm25, pm10 = get_sensor_data()
-            aqi_pm25 = get_aqi(pm25, "PM2.5")
-            aqi_pm10 = get_aqi(pm10, "PM10")
-            overall_aqi = max(aqi_pm25, aqi_pm10)
-            
-            # Insert data into PostgreSQL database
-            insert_aqi_data(pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi)
-
-            # Wait before the next reading
-            # read every minute
-            time.sleep(30)
-    except KeyboardInterrupt:
-        print("Stopping AQI monitoring...")
-    finally:
-        sensor.close()
+    # Insert data into PostgreSQL database
+    insert_aqi_data(pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi, window)
+
+def process_sds011_sensor():
+    """Read the SDS011 sensor and insert the reading with its AQI."""
+    pm25, pm10 = get_sensor_data()
+    store_sds011_reading(pm25, pm10)
+
+def process_weather():
+    """Fetch weather data from the API and insert it."""
+    insert_weather_data(fetch_weather_data())
 
 def convert_ppm_to_ugm3(ppm_value, molar_mass):
     """Convert ppm to µg/m³ using the molar mass of the gas."""
@@ -198,9 +198,11 @@ def calculate_aqi(concentration, breakpoints):
     return 0  # Default to 0 if out of range
 
 def process_zpsh01_sensor():
-            # Fetch data from ZPHS01B sensor
-        zpsh01_data = get_zpsh01_sensor_data()
-        
+    """Read the ZPHS01B sensor and insert the reading."""
+    store_zpsh01_reading(get_zpsh01_sensor_data())
+
+def store_zpsh01_reading(zpsh01_data):
+        """Insert a ZPHS01B reading, or the mean of a window of readings."""
         # Convert ppm to µg/m³
         # zpsh01_data['co'] = convert_ppm_to_ugm3(zpsh01_data['co'], 28.01)  # CO
         # zpsh01_data['o3'] = convert_ppm_to_ugm3(zpsh01_data['o3'], 48.00)  # O3
@@ -229,5 +231,157 @@ def process_zpsh01_sensor():
     
         
     
+# Each source is sampled on its own cadence (seconds between samples), concurrently with the others
+SDS011_INTERVAL = float(os.getenv("SDS011_INTERVAL", "60"))
+ZPHS01B_INTERVAL = float(os.getenv("ZPHS01B_INTERVAL", "60"))
+WEATHER_INTERVAL = float(os.getenv("WEATHER_INTERVAL", "60"))
+
+SOURCES = [
+    ("sds011", SDS011_INTERVAL, process_sds011_sensor),
+    ("zphs01b", ZPHS01B_INTERVAL, process_zpsh01_sensor),
+    ("weather", WEATHER_INTERVAL, process_weather),
+]
+
+# "duty-cycle" wakes each sensor for a single reading per sample. "continuous" keeps the sensors
+# measuring, reads them every CONTINUOUS_READ_INTERVAL seconds and stores one row per interval
+# with the mean of the readings plus their min, max and count, so short spikes are not missed.
+SAMPLING_MODE = os.getenv("SAMPLING_MODE", "duty-cycle")
+CONTINUOUS_READ_INTERVAL = float(os.getenv("CONTINUOUS_READ_INTERVAL", "1"))
+
+# name, window (seconds), start, read, stop, store(summary) for the continuous mode
+CONTINUOUS_SOURCES = [
+    ("sds011", SDS011_INTERVAL,
+     lambda: sensor.sleep(sleep=False), read_sds011, lambda: sensor.sleep(sleep=True),
+     lambda summary: store_sds011_reading(summary["pm25"], summary["pm10"], summary)),
+    ("zphs01b", ZPHS01B_INTERVAL,
+     zpsh01_sensor.start_measurement, zpsh01_sensor.read_data, zpsh01_sensor.stop_measurement,
+     store_zpsh01_reading),
+]
+
+class ReadingWindow:
+    """Mean, min, max and count of the readings taken during one window."""
+
+    def __init__(self):
+        self.count = 0
+        self.counts = {}
+        self.sums = {}
+        self.mins = {}
+        self.maxs = {}
+
+    def add(self, values):
+        self.count += 1
+        for key, value in values.items():
+            if value is None:
+                continue
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.sums[key] = self.sums.get(key, 0) + value
+            self.mins[key] = min(self.mins.get(key, value), value)
+            self.maxs[key] = max(self.maxs.get(key, value), value)
+
+    def summary(self):
+        """{field: mean, field + "_min": min, field + "_max": max, "sample_count": readings}"""
+        summary = {"sample_count": self.count}
+        for key, total in self.sums.items():
+            summary[key] = total / self.counts[key]
+            summary[f"{key}_min"] = self.mins[key]
+            summary[f"{key}_max"] = self.maxs[key]
+        return summary
+
+async def run_continuous(name, window_seconds, start, read, stop, store):
+    """
+    Keep a sensor measuring and read it every CONTINUOUS_READ_INTERVAL seconds in a worker
+    thread, storing one aggregated row per `window_seconds`. The row is timestamped when the
+    window closes.
+    """
+    loop = asyncio.get_running_loop()
+    await asyncio.to_thread(start)
+    try:
+        await asyncio.sleep(15)  # Warm up the sensor once
+        window = ReadingWindow()
+        window_start = next_read = loop.time()
+        while True:
+            try:
+                window.add(await asyncio.to_thread(read))
+            except Exception as e:
+                print(f"Error reading {name}: {e}")
+            now = loop.time()
+
+            if now - window_start >= window_seconds:
+                if window.count:
+                    try:
+                        await asyncio.to_thread(store, window.summary())
+                    except Exception as e:
+                        print(f"Error storing {name}: {e}")
+                print(f"{name}: {window.count} readings over {now - window_start:.1f}s (window {window_seconds:g}s)")
+                window = ReadingWindow()
+                window_start = now
+
+            next_read = max(next_read + CONTINUOUS_READ_INTERVAL, now)
+            await asyncio.sleep(next_read - now)
+    finally:
+        # Rest the sensor (SDS011 laser and fan) while the collector is not running; in a worker
+        # thread like the other sensor calls, so the other sources keep running meanwhile
+        await asyncio.to_thread(stop)
+
+
+async def run_source(name, interval, collect):
+    """
+    Call `collect` every `interval` seconds in a worker thread, so sensor warm-ups and HTTP
+    requests of different sources overlap. Samples are scheduled on a fixed grid; a sample that
+    overruns its interval starts the next one right away instead of letting the delay pile up.
+    """
+    loop = asyncio.get_running_loop()
+    next_run = loop.time()
+    previous_start = None
+    while True:
+        started = loop.time()
+        try:
+            await asyncio.to_thread(collect)
+        except Exception as e:
+            print(f"Error sampling {name}: {e}")
+        finished = loop.time()
+
+        # Report the interval actually achieved, which is what the readings' timestamps show
+        since_previous = f"{started - previous_start:.1f}s" if previous_start is not None else "first sample"
+        print(f"{name}: sample took {finished - started:.1f}s, interval {since_previous} (target {interval:g}s)")
+        previous_start = started
+
+        next_run = max(next_run + interval, finished)
+        await asyncio.sleep(next_run - finished)
+
+async def run_sources():
+    if SAMPLING_MODE == "continuous":
+        continuous = {source[0] for source in CONTINUOUS_SOURCES}
+        tasks = [run_continuous(*source) for source in CONTINUOUS_SOURCES]
+        tasks += [run_source(*source) for source in SOURCES if source[0] not in continuous]
+    else:
+        tasks = [run_source(*source) for source in SOURCES]
+    await asyncio.gather(*tasks)
+
+def main():
+    """Main function to fetch AQI data and insert into database."""
+
+    # Apply migrations on startup
+    apply_migrations()
+
+    # Make sure this month's partitions exist even if the maintenance timer is not installed
+    connection = get_db_connection()
+    if connection is not None:
+        ensure_partitions(connection)
+        connection.close()
+
+    # Write readings spooled while the database was down on a previous run
+    drain_spool()
+
+    try:
+        asyncio.run(run_sources())
+    except KeyboardInterrupt:
+        print("Stopping AQI monitoring...")
+    finally:
+        sensor.close()
+        zpsh01_sensor.close()
+        batch_writer.stop()
+        insert_connection.close()
+
 if __name__ == "__main__":
     main()
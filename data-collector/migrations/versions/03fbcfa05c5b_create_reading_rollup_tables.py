@@ -0,0 +1,124 @@
+"""create 1m/1h/1d rollup tables for aqi_readings and zphs01b_readings
+
+Revision ID: 03fbcfa05c5b
+Revises: add_city_locality_columns
+Create Date: 2026-10-18 09:12:41.310274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '03fbcfa05c5b'
+down_revision: Union[str, None] = 'add_city_locality_columns'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Columns rolled up for each raw table (all NOT NULL in the raw tables)
+ROLLUP_FIELDS = {
+    'aqi_readings': ['pm25', 'pm10', 'aqi_pm25', 'aqi_pm10', 'overall_aqi'],
+    'zphs01b_readings': [
+        'pm1_0', 'pm2_5', 'pm10', 'co2', 'voc', 'temperature', 'humidity',
+        'ch2o', 'co', 'o3', 'no2', 'overall_aqi',
+    ],
+}
+
+# Rollup table suffix -> bucket size in seconds
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+
+def bucket_sql(seconds):
+    # Same bucketing as the backend's aggregation.bucket_expression()
+    return f"timezone('UTC', to_timestamp(floor(extract(epoch from timestamp) / {seconds}) * {seconds}))"
+
+
+def select_sql(fields, seconds, source):
+    aggregates = ', '.join(f"sum({f}), min({f}), max({f})" for f in fields)
+    return f"SELECT {bucket_sql(seconds)}, count(*), {aggregates} FROM {source}"
+
+
+def insert_columns(fields):
+    return ', '.join(['bucket', 'sample_count'] + [f"{f}_{s}" for f in fields for s in ('sum', 'min', 'max')])
+
+
+def upsert_sql(table, fields, suffix, seconds, source):
+    """Merge per-bucket aggregates of `source` into the rollup table."""
+    updates = ', '.join(
+        ['sample_count = r.sample_count + EXCLUDED.sample_count']
+        + [f"{f}_sum = r.{f}_sum + EXCLUDED.{f}_sum" for f in fields]
+        + [f"{f}_min = LEAST(r.{f}_min, EXCLUDED.{f}_min)" for f in fields]
+        + [f"{f}_max = GREATEST(r.{f}_max, EXCLUDED.{f}_max)" for f in fields]
+    )
+    return f"""
+        INSERT INTO aqi_data.{table}_{suffix} AS r ({insert_columns(fields)})
+        {select_sql(fields, seconds, source)} GROUP BY 1
+        ON CONFLICT (bucket) DO UPDATE SET {updates};
+    """
+
+
+def upgrade():
+    for table, fields in ROLLUP_FIELDS.items():
+        for suffix in RESOLUTIONS:
+            columns = [sa.Column(f"{f}_{s}", sa.Float, nullable=False) for f in fields for s in ('sum', 'min', 'max')]
+            op.create_table(
+                f"{table}_{suffix}",
+                sa.Column('bucket', sa.TIMESTAMP, primary_key=True),  # Start of the bucket
+                sa.Column('sample_count', sa.Integer, nullable=False),  # Raw rows in the bucket
+                *columns,
+                schema='aqi_data'
+            )
+
+        # Statement-level trigger: every INSERT (single row from the collector or a
+        # multi-row chunk from the cloud sync) folds all of its new rows into each
+        # rollup with one upsert per resolution.
+        upserts = ''.join(upsert_sql(table, fields, suffix, seconds, 'new_rows') for suffix, seconds in RESOLUTIONS.items())
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION aqi_data.{table}_rollup() RETURNS trigger AS $$
+            BEGIN
+                {upserts}
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_rollup
+            AFTER INSERT ON aqi_data.{table}
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION aqi_data.{table}_rollup();
+        """)
+
+    # Rebuild every rollup bucket from `since` onwards from the raw rows. Used for
+    # the initial backfill and to repair rollups after manual edits.
+    rebuilds = ''
+    for table, fields in ROLLUP_FIELDS.items():
+        for suffix, seconds in RESOLUTIONS.items():
+            start = f"timezone('UTC', to_timestamp(floor(extract(epoch from since) / {seconds}) * {seconds}))"
+            rebuilds += f"""
+                DELETE FROM aqi_data.{table}_{suffix} WHERE bucket >= {start};
+                INSERT INTO aqi_data.{table}_{suffix} ({insert_columns(fields)})
+                {select_sql(fields, seconds, f'aqi_data.{table}')}
+                WHERE timestamp >= {start} GROUP BY 1;
+            """
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION aqi_data.refresh_rollups(since TIMESTAMP DEFAULT '-infinity') RETURNS void AS $$
+        BEGIN
+            {rebuilds}
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+    # Fill the rollups from the readings already stored; the triggers add everything after this
+    op.execute("SELECT aqi_data.refresh_rollups();")
+
+
+def downgrade():
+    op.execute("DROP FUNCTION IF EXISTS aqi_data.refresh_rollups(TIMESTAMP);")
+    for table in ROLLUP_FIELDS:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_rollup ON aqi_data.{table};")
+        op.execute(f"DROP FUNCTION IF EXISTS aqi_data.{table}_rollup();")
+        for suffix in RESOLUTIONS:
+            op.drop_table(f"{table}_{suffix}", schema='aqi_data')
@@ -0,0 +1,123 @@
+"""add min/max/sample_count columns for readings aggregated over a window
+
+Revision ID: 5b2e9c4f7a10
+Revises: d16118857ae5
+Create Date: 2026-10-18 18:02:14.530817
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b2e9c4f7a10'
+down_revision: Union[str, None] = 'd16118857ae5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# In continuous sampling mode a row holds the mean of a window of readings; these fields also
+# keep the window's min and max, so short spikes survive the averaging. NULL for single readings.
+WINDOW_FIELDS = {
+    'aqi_readings': {'pm25': sa.Float, 'pm10': sa.Float},
+    'zphs01b_readings': {'pm1_0': sa.Float, 'pm2_5': sa.Float, 'pm10': sa.Float, 'co2': sa.Float, 'voc': sa.Integer},
+}
+
+# Same as migration 03fbcfa05c5b, which created the rollups
+ROLLUP_FIELDS = {
+    'aqi_readings': ['pm25', 'pm10', 'aqi_pm25', 'aqi_pm10', 'overall_aqi'],
+    'zphs01b_readings': [
+        'pm1_0', 'pm2_5', 'pm10', 'co2', 'voc', 'temperature', 'humidity',
+        'ch2o', 'co', 'o3', 'no2', 'overall_aqi',
+    ],
+}
+RESOLUTIONS = {'1m': 60, '1h': 3600, '1d': 86400}
+
+
+def bucket_sql(seconds):
+    return f"timezone('UTC', to_timestamp(floor(extract(epoch from timestamp) / {seconds}) * {seconds}))"
+
+
+def select_sql(table, seconds, source, windowed):
+    """Per-bucket aggregates; with `windowed`, min/max come from the window columns when set."""
+    aggregates = []
+    for f in ROLLUP_FIELDS[table]:
+        if windowed and f in WINDOW_FIELDS[table]:
+            aggregates.append(f"sum({f}), min(coalesce({f}_min, {f})), max(coalesce({f}_max, {f}))")
+        else:
+            aggregates.append(f"sum({f}), min({f}), max({f})")
+    return f"SELECT {bucket_sql(seconds)}, count(*), {', '.join(aggregates)} FROM {source}"
+
+
+def insert_columns(fields):
+    return ', '.join(['bucket', 'sample_count'] + [f"{f}_{s}" for f in fields for s in ('sum', 'min', 'max')])
+
+
+def upsert_sql(table, suffix, seconds, windowed):
+    fields = ROLLUP_FIELDS[table]
+    updates = ', '.join(
+        ['sample_count = r.sample_count + EXCLUDED.sample_count']
+        + [f"{f}_sum = r.{f}_sum + EXCLUDED.{f}_sum" for f in fields]
+        + [f"{f}_min = LEAST(r.{f}_min, EXCLUDED.{f}_min)" for f in fields]
+        + [f"{f}_max = GREATEST(r.{f}_max, EXCLUDED.{f}_max)" for f in fields]
+    )
+    return f"""
+        INSERT INTO aqi_data.{table}_{suffix} AS r ({insert_columns(fields)})
+        {select_sql(table, seconds, 'new_rows', windowed)} GROUP BY 1
+        ON CONFLICT (bucket) DO UPDATE SET {updates};
+    """
+
+
+def create_rollup_functions(windowed):
+    """(Re)create the rollup trigger functions and refresh_rollups()."""
+    for table in ROLLUP_FIELDS:
+        upserts = ''.join(upsert_sql(table, suffix, seconds, windowed) for suffix, seconds in RESOLUTIONS.items())
+        op.execute(f"""
+            CREATE OR REPLACE FUNCTION aqi_data.{table}_rollup() RETURNS trigger AS $$
+            BEGIN
+                {upserts}
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql;
+        """)
+
+    rebuilds = ''
+    for table, fields in ROLLUP_FIELDS.items():
+        for suffix, seconds in RESOLUTIONS.items():
+            start = f"timezone('UTC', to_timestamp(floor(extract(epoch from since) / {seconds}) * {seconds}))"
+            rebuilds += f"""
+                DELETE FROM aqi_data.{table}_{suffix} WHERE bucket >= {start};
+                INSERT INTO aqi_data.{table}_{suffix} ({insert_columns(fields)})
+                {select_sql(table, seconds, f'aqi_data.{table}', windowed)}
+                WHERE timestamp >= {start} GROUP BY 1;
+            """
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION aqi_data.refresh_rollups(since TIMESTAMP DEFAULT '-infinity') RETURNS void AS $$
+        BEGIN
+            {rebuilds}
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+
+
+def upgrade():
+    # Added to the partitioned parents, so every partition gets the columns
+    for table, fields in WINDOW_FIELDS.items():
+        for field, column_type in fields.items():
+            op.add_column(table, sa.Column(f"{field}_min", column_type, nullable=True), schema='aqi_data')
+            op.add_column(table, sa.Column(f"{field}_max", column_type, nullable=True), schema='aqi_data')
+        op.add_column(table, sa.Column('sample_count', sa.Integer, nullable=True), schema='aqi_data')
+
+    create_rollup_functions(windowed=True)
+
+
+def downgrade():
+    create_rollup_functions(windowed=False)
+
+    for table, fields in WINDOW_FIELDS.items():
+        op.drop_column(table, 'sample_count', schema='aqi_data')
+        for field in fields:
+            op.drop_column(table, f"{field}_max", schema='aqi_data')
+            op.drop_column(table, f"{field}_min", schema='aqi_data')
@@ -0,0 +1,35 @@
+"""add sync_progress table recording the last reading id copied to each sync target
+
+Revision ID: 7c3d1e2f9a45
+Revises: 5b2e9c4f7a10
+Create Date: 2026-10-18 21:14:52.083611
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c3d1e2f9a45'
+down_revision: Union[str, None] = '5b2e9c4f7a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # pi-to-cloud copies rows by id rather than by timestamp: batched writes and readings drained
+    # from the spool are inserted after newer readings, but always get a higher id.
+    op.create_table(
+        'sync_progress',
+        sa.Column('target', sa.Text, primary_key=True),
+        sa.Column('table_name', sa.Text, primary_key=True),
+        sa.Column('last_id', sa.BigInteger, nullable=False),
+        sa.Column('updated_at', sa.TIMESTAMP, nullable=False, server_default=sa.func.now()),
+        schema='aqi_data'
+    )
+
+
+def downgrade():
+    op.drop_table('sync_progress', schema='aqi_data')
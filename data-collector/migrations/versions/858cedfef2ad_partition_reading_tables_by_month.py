@@ -0,0 +1,105 @@
+"""partition aqi_readings and zphs01b_readings by month
+
+Revision ID: 858cedfef2ad
+Revises: a066372d127f
+Create Date: 2026-10-18 11:26:52.470913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '858cedfef2ad'
+down_revision: Union[str, None] = 'a066372d127f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TABLES = ['aqi_readings', 'zphs01b_readings']
+
+# Partitions created ahead of the current month; partitions.py keeps this window moving
+MONTHS_AHEAD = 3
+
+
+def rebuild(table, partitioned):
+    """
+    Recreate `table` as a partitioned (or plain) table with the same columns and data.
+
+    Postgres cannot convert a table in place, so the rows are copied into a new table that
+    takes over the id sequence, constraints, indexes and rollup trigger of the old one.
+    """
+    bind = op.get_bind()
+    old = f'{table}_old'
+    op.execute(f"ALTER TABLE aqi_data.{table} RENAME TO {old};")
+    op.execute(f"DROP TRIGGER IF EXISTS {table}_rollup ON aqi_data.{old};")
+
+    partition_clause = 'PARTITION BY RANGE (timestamp)' if partitioned else ''
+    op.execute(f"""
+        CREATE TABLE aqi_data.{table} (LIKE aqi_data.{old} INCLUDING DEFAULTS) {partition_clause};
+    """)
+
+    if partitioned:
+        # One partition per month holding existing rows, plus the months ahead, and a
+        # default partition so an unexpected timestamp never fails an insert.
+        first = bind.execute(sa.text(f"SELECT min(timestamp)::date FROM aqi_data.{old}")).scalar()
+        op.execute(f"""
+            SELECT aqi_data.create_monthly_partitions(
+                '{table}',
+                {f"'{first}'" if first else 'current_date'},
+                (current_date + interval '{MONTHS_AHEAD} months')::date
+            );
+        """)
+        op.execute(f"CREATE TABLE aqi_data.{table}_default PARTITION OF aqi_data.{table} DEFAULT;")
+
+    op.execute(f"INSERT INTO aqi_data.{table} SELECT * FROM aqi_data.{old};")
+
+    sequence = bind.execute(sa.text("SELECT pg_get_serial_sequence(:t, 'id')"), {'t': f'aqi_data.{old}'}).scalar()
+    op.execute(f"ALTER SEQUENCE {sequence} OWNED BY aqi_data.{table}.id;")
+    op.execute(f"DROP TABLE aqi_data.{old};")
+
+    # Unique constraints on a partitioned table must include the partition key
+    primary_key = ['id', 'timestamp'] if partitioned else ['id']
+    op.create_primary_key(f'{table}_pkey', table, primary_key, schema='aqi_data')
+    op.create_unique_constraint(f'uq_{table}_timestamp', table, ['timestamp'], schema='aqi_data')
+    op.execute(f"CREATE INDEX ix_{table}_timestamp_id_desc ON aqi_data.{table} (timestamp DESC, id DESC);")
+
+    op.execute(f"""
+        CREATE TRIGGER {table}_rollup
+        AFTER INSERT ON aqi_data.{table}
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION aqi_data.{table}_rollup();
+    """)
+    op.execute(f"ANALYZE aqi_data.{table};")
+
+
+def upgrade():
+    # Creates aqi_data.<parent>_yYYYYmMM for every month between from_month and to_month.
+    # Also called by partitions.py to pre-create upcoming months.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION aqi_data.create_monthly_partitions(parent TEXT, from_month DATE, to_month DATE)
+        RETURNS void AS $$
+        DECLARE
+            month DATE := date_trunc('month', from_month);
+        BEGIN
+            WHILE month <= to_month LOOP
+                EXECUTE format(
+                    'CREATE TABLE IF NOT EXISTS aqi_data.%I PARTITION OF aqi_data.%I FOR VALUES FROM (%L) TO (%L)',
+                    parent || '_' || to_char(month, '"y"YYYY"m"MM'), parent,
+                    month, (month + interval '1 month')::date
+                );
+                month := month + interval '1 month';
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    for table in TABLES:
+        rebuild(table, partitioned=True)
+
+
+def downgrade():
+    for table in TABLES:
+        rebuild(table, partitioned=False)
+    op.execute("DROP FUNCTION IF EXISTS aqi_data.create_monthly_partitions(TEXT, DATE, DATE);")
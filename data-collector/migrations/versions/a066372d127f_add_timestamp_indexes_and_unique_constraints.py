@@ -0,0 +1,88 @@
+"""add timestamp indexes and unique timestamp constraints to reading tables
+
+Revision ID: a066372d127f
+Revises: 03fbcfa05c5b
+Create Date: 2026-10-18 10:03:17.845120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a066372d127f'
+down_revision: Union[str, None] = '03fbcfa05c5b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Reading tables: pi-to-cloud syncs them with ON CONFLICT (timestamp), and the API
+# pages through them newest-first on (timestamp, id).
+READING_TABLES = ['aqi_readings', 'zphs01b_readings', 'weather_data']
+
+# Append-only log tables created by the backend. They may not exist on the Pi.
+LOG_TABLES = ['request_logs', 'tracking_events']
+
+# Raw tables with rollups (see 03fbcfa05c5b) that need rebuilding after dedupe
+ROLLUP_TABLES = ['aqi_readings', 'zphs01b_readings']
+
+
+def has_unique_timestamp(bind, table):
+    """True if a unique index on exactly (timestamp) already exists, e.g. from pi-to-cloud/sql."""
+    return bind.execute(sa.text("""
+        SELECT EXISTS (
+            SELECT 1 FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = to_regclass(:table) AND i.indisunique
+              AND i.indnatts = 1 AND a.attname = 'timestamp'
+        )
+    """), {'table': f'aqi_data.{table}'}).scalar()
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    for table in READING_TABLES:
+        # Drop duplicate timestamps (keeping the oldest row) so the constraint can be added
+        first_duplicate = bind.execute(sa.text(f"""
+            WITH deleted AS (
+                DELETE FROM aqi_data.{table} a USING aqi_data.{table} b
+                WHERE a.timestamp = b.timestamp AND a.id > b.id
+                RETURNING a.timestamp
+            )
+            SELECT min(timestamp) FROM deleted
+        """)).scalar()
+        if first_duplicate is not None and table in ROLLUP_TABLES:
+            bind.execute(sa.text("SELECT aqi_data.refresh_rollups(:since)"), {'since': first_duplicate})
+
+        if not has_unique_timestamp(bind, table):
+            op.create_unique_constraint(f'uq_{table}_timestamp', table, ['timestamp'], schema='aqi_data')
+
+        # Matches ORDER BY timestamp DESC, id DESC and the (timestamp, id) < cursor seek
+        op.execute(f"""
+            CREATE INDEX IF NOT EXISTS ix_{table}_timestamp_id_desc
+            ON aqi_data.{table} (timestamp DESC, id DESC);
+        """)
+
+    for table in LOG_TABLES:
+        # BRIN stays a few pages large on append-only tables ordered by insert time
+        op.execute(f"""
+            DO $$
+            BEGIN
+                IF to_regclass('aqi_data.{table}') IS NOT NULL THEN
+                    CREATE INDEX IF NOT EXISTS ix_{table}_timestamp_brin
+                    ON aqi_data.{table} USING brin (timestamp);
+                END IF;
+            END $$;
+        """)
+
+
+def downgrade():
+    for table in LOG_TABLES:
+        op.execute(f"DROP INDEX IF EXISTS aqi_data.ix_{table}_timestamp_brin;")
+
+    for table in READING_TABLES:
+        op.execute(f"DROP INDEX IF EXISTS aqi_data.ix_{table}_timestamp_id_desc;")
+        op.execute(f"ALTER TABLE aqi_data.{table} DROP CONSTRAINT IF EXISTS uq_{table}_timestamp;")
@@ -0,0 +1,50 @@
+"""notify listeners of new reading rows
+
+Revision ID: d16118857ae5
+Revises: 858cedfef2ad
+Create Date: 2026-10-18 14:05:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd16118857ae5'
+down_revision: Union[str, None] = '858cedfef2ad'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Channel the backend LISTENs on; payloads are {"table": ..., "id": ...}
+CHANNEL = 'new_readings'
+
+READING_TABLES = ['aqi_readings', 'zphs01b_readings', 'weather_data']
+
+
+def upgrade():
+    # The table name is passed as an argument: on a partitioned table TG_TABLE_NAME is the
+    # partition's name. Only the id is sent, so the payload stays far below NOTIFY's 8000-byte
+    # limit and the backend reads the row in its API format. Notifications are delivered when
+    # the inserting transaction commits; rows skipped by ON CONFLICT DO NOTHING send nothing.
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION aqi_data.notify_new_reading() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{CHANNEL}', json_build_object('table', TG_ARGV[0], 'id', NEW.id)::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    for table in READING_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_notify
+            AFTER INSERT ON aqi_data.{table}
+            FOR EACH ROW EXECUTE FUNCTION aqi_data.notify_new_reading('{table}');
+        """)
+
+
+def downgrade():
+    for table in READING_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_notify ON aqi_data.{table};")
+    op.execute("DROP FUNCTION IF EXISTS aqi_data.notify_new_reading();")
@@ -0,0 +1,160 @@
+# partitions.py
+"""
+Monthly partition maintenance for the partitioned reading tables (migration 858cedfef2ad).
+
+- Pre-creates the partitions for the next few months so inserts never land in the default
+  partition. Rows that did land there (e.g. in a database nobody ran this against) are moved
+  into their month's partition first, since a month cannot be partitioned while the default
+  partition holds rows for it.
+- Optionally detaches partitions older than the retention window and moves them to the
+  aqi_data_archive schema (or drops them with --drop). Archived months disappear from the
+  API's raw readings. Their rollup buckets are kept until refresh_rollups() is run over them
+  (e.g. backfill_rollups.py without --since), which rebuilds the rollups from attached
+  partitions only and so deletes those buckets.
+
+    python partitions.py                                  # pre-create 3 months ahead
+    python partitions.py --retain-months 12               # ... and archive older months
+    python partitions.py --dsn "$REMOTE_RDS_DB"           # another database, e.g. the cloud copy
+"""
+import argparse
+import re
+import sys
+from datetime import date
+import psycopg2
+from db import get_db_connection
+
+PARTITIONED_TABLES = ['aqi_readings', 'zphs01b_readings']
+ARCHIVE_SCHEMA = 'aqi_data_archive'
+PARTITION_NAME = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def add_months(month, months):
+    """First day of the month `months` after `month` (negative to go back)."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def move_default_rows(cursor, table):
+    """
+    Give every month with rows in the default partition its own partition and move the rows
+    into it. Returns the months moved.
+
+    The partition is filled as a plain table and then attached, so the rows are not inserted
+    through the parent again (its rollup and notify triggers already saw them).
+    """
+    cursor.execute(f"SELECT DISTINCT date_trunc('month', timestamp)::date FROM aqi_data.{table}_default ORDER BY 1")
+    months = [month for (month,) in cursor.fetchall()]
+    if not months:
+        return months
+
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'aqi_data' AND table_name = %s ORDER BY ordinal_position
+    """, (table,))
+    columns = ", ".join(name for (name,) in cursor.fetchall())
+    for month in months:
+        name = f"{table}_y{month:%Y}m{month:%m}"
+        bounds = (month, add_months(month, 1))
+        cursor.execute(f"CREATE TABLE aqi_data.{name} (LIKE aqi_data.{table} INCLUDING DEFAULTS)")
+        cursor.execute(f"""
+            WITH moved AS (
+                DELETE FROM aqi_data.{table}_default
+                WHERE timestamp >= %s AND timestamp < %s
+                RETURNING {columns}
+            )
+            INSERT INTO aqi_data.{name} ({columns}) SELECT {columns} FROM moved
+        """, bounds)
+        cursor.execute(f"ALTER TABLE aqi_data.{table} ATTACH PARTITION aqi_data.{name} FOR VALUES FROM (%s) TO (%s)", bounds)
+    return months
+
+
+def ensure_partitions(connection, months_ahead=3, today=None):
+    """Create the partitions for the current month and the next `months_ahead` months."""
+    this_month = (today or date.today()).replace(day=1)
+    cursor = connection.cursor()
+    try:
+        for table in PARTITIONED_TABLES:
+            moved = move_default_rows(cursor, table)
+            if moved:
+                print(f"Moved rows of {', '.join(f'{month:%Y-%m}' for month in moved)} out of {table}_default")
+            cursor.execute(
+                "SELECT aqi_data.create_monthly_partitions(%s, %s, %s)",
+                (table, this_month, add_months(this_month, months_ahead)),
+            )
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def list_partitions(cursor, table):
+    """Return [(partition name, first day of its month)] for the monthly partitions of `table`."""
+    cursor.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+    """, (f'aqi_data.{table}',))
+    partitions = []
+    for (name,) in cursor.fetchall():
+        match = PARTITION_NAME.search(name)
+        if match:  # Skips the default partition
+            partitions.append((name, date(int(match.group(1)), int(match.group(2)), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def archive_partitions(connection, retain_months, drop=False, today=None):
+    """Detach monthly partitions that ended before the retention window; archive or drop them."""
+    cutoff = add_months((today or date.today()).replace(day=1), -retain_months)
+    cursor = connection.cursor()
+    archived = []
+    try:
+        cursor.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+        for table in PARTITIONED_TABLES:
+            for name, month in list_partitions(cursor, table):
+                if month >= cutoff:
+                    break
+                cursor.execute(f"ALTER TABLE aqi_data.{table} DETACH PARTITION aqi_data.{name}")
+                if drop:
+                    cursor.execute(f"DROP TABLE aqi_data.{name}")
+                else:
+                    cursor.execute(f"ALTER TABLE aqi_data.{name} SET SCHEMA {ARCHIVE_SCHEMA}")
+                archived.append(name)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain monthly partitions of the reading tables.")
+    parser.add_argument("--months-ahead", type=int, default=3, help="Months of partitions to pre-create")
+    parser.add_argument("--retain-months", type=int, default=None,
+                        help=f"Detach partitions older than this many months into {ARCHIVE_SCHEMA}")
+    parser.add_argument("--drop", action="store_true", help="Drop detached partitions instead of archiving them")
+    parser.add_argument("--dsn", default=None,
+                        help="Connection string of the database to maintain (defaults to db.DB_CONFIG)")
+    args = parser.parse_args()
+
+    connection = psycopg2.connect(args.dsn) if args.dsn else get_db_connection()
+    if connection is None:
+        print("Failed to connect to the database.")
+        sys.exit(1)
+
+    try:
+        ensure_partitions(connection, args.months_ahead)
+        print(f"Partitions ensured {args.months_ahead} months ahead.")
+        if args.retain_months is not None:
+            archived = archive_partitions(connection, args.retain_months, args.drop)
+            action = "Dropped" if args.drop else f"Archived to {ARCHIVE_SCHEMA}"
+            print(f"{action}: {', '.join(archived) or 'nothing'}")
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# spool.py
+"""
+On-disk spool for readings that could not be written to Postgres.
+
+Readings are appended to a SQLite database next to the collector while the database is
+unreachable and drained in order once it is back (see db.drain_spool). Drained readings keep the
+timestamp at which they were read but get new ids, which is what pi-to-cloud syncs by, so they
+reach the cloud database even though newer readings were synced first. SQLite runs in WAL
+mode with synchronous=NORMAL: each append is a small sequential WAL write that is fsynced
+only at checkpoints, which keeps SD-card wear low. A power cut can lose the last few
+appends, but a crash of the collector alone cannot.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+
+class Spool:
+    """Bounded FIFO of (statement name, reading timestamp, column values) rows."""
+
+    def __init__(self, path, max_rows):
+        self.path = path
+        self.max_rows = max_rows
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS readings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                statement TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                vals TEXT NOT NULL
+            )
+        """)
+        self._pending = self.connection.execute("SELECT count(*) FROM readings").fetchone()[0]
+
+    def pending(self):
+        """Number of readings waiting to be drained."""
+        return self._pending
+
+    def append(self, statement, timestamp, values):
+        """Store one reading; when the spool is full the oldest readings are discarded."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.execute(
+                    "INSERT INTO readings (statement, timestamp, vals) VALUES (?, ?, ?)",
+                    (statement, timestamp.isoformat(), json.dumps(values)),
+                )
+                self._pending += 1
+                overflow = self._pending - self.max_rows
+                if overflow > 0:
+                    self.connection.execute(
+                        "DELETE FROM readings WHERE id IN (SELECT id FROM readings ORDER BY id LIMIT ?)",
+                        (overflow,),
+                    )
+                    self._pending -= overflow
+                    print(f"Spool full ({self.max_rows} readings), discarded the {overflow} oldest")
+
+    def take(self, limit):
+        """Return up to `limit` of the oldest readings as (id, statement, (timestamp, *values))."""
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT id, statement, timestamp, vals FROM readings ORDER BY id LIMIT ?", (limit,)
+            ).fetchall()
+        return [
+            (row_id, statement, (datetime.fromisoformat(timestamp), *json.loads(values)))
+            for row_id, statement, timestamp, values in rows
+        ]
+
+    def remove(self, ids):
+        """Delete readings that have been written to Postgres."""
+        with self.lock:
+            with self.connection:
+                self.connection.execute("BEGIN")
+                self.connection.executemany("DELETE FROM readings WHERE id = ?", [(row_id,) for row_id in ids])
+                self._pending = self.connection.execute("SELECT count(*) FROM readings").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
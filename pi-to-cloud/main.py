@@ -1,8 +1,12 @@
 from dotenv import load_dotenv
 import os
 import psycopg2
+from psycopg2.extras import execute_values
 import time
 from datetime import datetime
+from alembic import command
+from alembic.config import Config
+from sqlalchemy.engine import make_url
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,112 +16,111 @@ LOCAL_DB = os.getenv("LOCAL_DB")
 REMOTE_DB = os.getenv("REMOTE_DB")
 REMOTE_RDS_DB = os.getenv("REMOTE_RDS_DB")
 
+# The cloud database runs the collector's migrations, so every column synced below exists there too
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data-collector", "migrations")
+
+
+def migrate_remote_rds():
+    """Upgrade the cloud database to the collector's newest migration before syncing into it."""
+    try:
+        config = Config()
+        config.set_main_option("script_location", MIGRATIONS_DIR)
+        # Migrate through psycopg2, which the sync already depends on
+        url = make_url(REMOTE_RDS_DB).set(drivername="postgresql+psycopg2").render_as_string(hide_password=False)
+        # set_main_option interpolates %, which URL-encoded passwords may contain
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+        command.upgrade(config, "head")
+        print("Remote database schema is up to date")
+    except Exception as e:
+        print("Remote database migration failed:", e)
+
+
+# Columns copied for each reading table (ids are assigned by the target database)
+SYNC_COLUMNS = {
+    "aqi_readings": [
+        "timestamp", "pm25", "pm10", "aqi_pm25", "aqi_pm10", "overall_aqi",
+        "pm25_min", "pm25_max", "pm10_min", "pm10_max", "sample_count",
+    ],
+    "zphs01b_readings": [
+        "timestamp", "pm1_0", "pm2_5", "pm10", "co2", "voc", "temperature", "humidity",
+        "ch2o", "co", "o3", "no2", "aqi_pm2_5", "aqi_pm10", "aqi_co", "aqi_o3", "aqi_no2", "overall_aqi",
+        "pm1_0_min", "pm1_0_max", "pm2_5_min", "pm2_5_max", "pm10_min", "pm10_max",
+        "co2_min", "co2_max", "voc_min", "voc_max", "sample_count",
+    ],
+    "weather_data": [
+        "timestamp", "temperature", "humidity", "wind_speed", "wind_direction",
+        "rain_intensity", "rain_accumulation", "city_name", "locality_name",
+    ],
+}
+
+CHUNK_SIZE = 100
+
+# Rows are synced by local id, not timestamp: the collector commits readings in batches and drains
+# readings spooled during an outage later, so a row can appear after newer timestamps were synced,
+# but its id is always higher. Runs that find new rows also send a few ids below the last one synced
+# again, for rows that committed out of id order; ON CONFLICT (timestamp) DO NOTHING skips duplicates.
+SYNC_OVERLAP_IDS = 100
+
+
+def sync_table(local_conn, remote_conn, target, table):
+    """Copy the rows of aqi_data.`table` added since the last sync to `target` in chunks."""
+    columns = ", ".join(SYNC_COLUMNS[table])
+    local_cur = local_conn.cursor()
+    remote_cur = remote_conn.cursor()
+    try:
+        local_cur.execute(
+            "SELECT last_id FROM aqi_data.sync_progress WHERE target = %s AND table_name = %s", (target, table)
+        )
+        last_id = local_cur.fetchone()
+        last_id = last_id[0] if last_id else 0
+        print(f"Last synced id in {table}: {last_id}")
+
+        local_cur.execute(
+            f"SELECT id, {columns} FROM aqi_data.{table} WHERE id > %s ORDER BY id",
+            (last_id - SYNC_OVERLAP_IDS,),
+        )
+        rows = local_cur.fetchall()
+        if not any(row[0] > last_id for row in rows):
+            return
+        print(f"Found {len(rows)} rows to sync in {table}")
+
+        for i in range(0, len(rows), CHUNK_SIZE):
+            chunk = rows[i:i + CHUNK_SIZE]
+            execute_values(remote_cur, f"""
+                INSERT INTO aqi_data.{table} ({columns})
+                VALUES %s
+                ON CONFLICT (timestamp) DO NOTHING
+            """, [row[1:] for row in chunk], page_size=CHUNK_SIZE)
+            remote_conn.commit()
+            # Record progress per chunk, so an interrupted sync resumes where it stopped
+            local_cur.execute("""
+                INSERT INTO aqi_data.sync_progress (target, table_name, last_id, updated_at)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (target, table_name) DO UPDATE
+                SET last_id = GREATEST(sync_progress.last_id, EXCLUDED.last_id), updated_at = EXCLUDED.updated_at
+            """, (target, table, chunk[-1][0]))
+            local_conn.commit()
+            print(f"Inserted chunk {i // CHUNK_SIZE + 1} with {len(chunk)} rows into {table}")
+    finally:
+        local_cur.close()
+        remote_cur.close()
+
 
 def sync_data_rds():
     try:
         # Attempt to connect to local and remote databases
         local_conn = psycopg2.connect(LOCAL_DB)
         remote_rds_conn = psycopg2.connect(REMOTE_RDS_DB)
-        
-        local_cur = local_conn.cursor()
-        remote_cur = remote_rds_conn.cursor()
 
         print("Connected to both local and remote databases")
 
-        # Fetch the last run time from the local metadata table
-        local_cur.execute("SELECT last_run FROM aqi_data.sync_metadata_rds ORDER BY id DESC LIMIT 1")
-        last_sync_time = local_cur.fetchone()
-        last_sync_time = last_sync_time[0] if last_sync_time else datetime.min
-
-        print(f"Last sync timestamp: {last_sync_time}")
-
-        # Sync data from aqi_readings table
-        local_cur.execute("""
-            SELECT timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi 
-            FROM aqi_data.aqi_readings WHERE timestamp > %s
-        """, (last_sync_time,))
-        new_aqi_rows = local_cur.fetchall()
-
-        # Insert new rows into the remote aqi_readings table
-        CHUNK_SIZE = 100
-        if new_aqi_rows:
-            print(f"Found {len(new_aqi_rows)} new rows to sync in aqi_readings")
+        for table in ("aqi_readings", "zphs01b_readings", "weather_data"):
+            sync_table(local_conn, remote_rds_conn, "rds", table)
 
-            for i in range(0, len(new_aqi_rows), CHUNK_SIZE):
-                chunk = new_aqi_rows[i:i + CHUNK_SIZE]
-                remote_cur.executemany("""
-                    INSERT INTO aqi_data.aqi_readings (timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (timestamp) DO NOTHING
-                """, chunk)
-                remote_rds_conn.commit()
-                print(f"Inserted chunk {i // CHUNK_SIZE + 1} with {len(chunk)} rows into aqi_readings")
-
-        # Sync data from zphs01b_readings table
-        local_cur.execute("""
-            SELECT timestamp, pm1_0, pm2_5, pm10, co2, voc, temperature, humidity, 
-                   ch2o, co, o3, no2, aqi_pm2_5, aqi_pm10, aqi_co, aqi_o3, aqi_no2, overall_aqi
-            FROM aqi_data.zphs01b_readings WHERE timestamp > %s
-        """, (last_sync_time,))
-        new_zphs01b_rows = local_cur.fetchall()
-
-        if new_zphs01b_rows:
-            print(f"Found {len(new_zphs01b_rows)} new rows to sync in zphs01b_readings")
-
-            for i in range(0, len(new_zphs01b_rows), CHUNK_SIZE):
-                chunk = new_zphs01b_rows[i:i + CHUNK_SIZE]
-                remote_cur.executemany("""
-                    INSERT INTO aqi_data.zphs01b_readings (
-                        timestamp, pm1_0, pm2_5, pm10, co2, voc, temperature, humidity, 
-                        ch2o, co, o3, no2, aqi_pm2_5, aqi_pm10, aqi_co, aqi_o3, aqi_no2, overall_aqi
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (timestamp) DO NOTHING
-                """, chunk)
-                remote_rds_conn.commit()
-                print(f"Inserted chunk {i // CHUNK_SIZE + 1} with {len(chunk)} rows into zphs01b_readings")
-
-        # Update the sync metadata table with the current time after a successful sync
+        # Record the run; the sync position itself is kept in sync_progress
+        local_cur = local_conn.cursor()
         local_cur.execute("INSERT INTO aqi_data.sync_metadata_rds (last_run) VALUES (NOW() + INTERVAL '5 hours 30 minutes')")
-
-        # Fetch the last run time from the local metadata table
-        local_cur.execute("SELECT last_run FROM aqi_data.sync_metadata_weather_data ORDER BY id DESC LIMIT 1")
-        last_sync_time_weather_data = local_cur.fetchone()
-        last_sync_time_weather_data = last_sync_time_weather_data[0] if last_sync_time_weather_data else datetime.min
-
-        print(f"Last sync timestamp: {last_sync_time_weather_data}")
-        
-        # Sync data from weather_data table
-        # Modified code to fetch all required columns, including city_name and locality_name
-        local_cur.execute("""
-            SELECT timestamp, temperature, humidity, wind_speed, wind_direction, 
-                rain_intensity, rain_accumulation, city_name, locality_name
-            FROM aqi_data.weather_data WHERE timestamp > %s
-        """, (last_sync_time_weather_data,))
-        new_weather_rows = local_cur.fetchall()
-
-        CHUNK_SIZE = 100
-        if new_weather_rows:
-            print(f"Found {len(new_weather_rows)} new rows to sync in weather_data")
-
-            for i in range(0, len(new_weather_rows), CHUNK_SIZE):
-                chunk = new_weather_rows[i:i + CHUNK_SIZE]
-                remote_cur.executemany("""
-                    INSERT INTO aqi_data.weather_data (
-                        timestamp, temperature, humidity, wind_speed, wind_direction, 
-                        rain_intensity, rain_accumulation, city_name, locality_name
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (timestamp) DO NOTHING
-                """, chunk)
-                remote_rds_conn.commit()
-                print(f"Inserted chunk {i // CHUNK_SIZE + 1} with {len(chunk)} rows into weather_data")
-
-        # Update the sync metadata table with the current time after a successful sync
         local_cur.execute("INSERT INTO aqi_data.sync_metadata_weather_data (last_run) VALUES (NOW() + INTERVAL '5 hours 30 minutes')")
-
-        
-        
-        
-        
         local_conn.commit()
         print("Sync metadata updated with new timestamp.")
 
@@ -131,78 +134,25 @@ def sync_data_rds():
         # Close connections if they were successfully created
         if 'local_cur' in locals():
             local_cur.close()
-        if 'remote_cur' in locals():
-            remote_cur.close()
         if 'local_conn' in locals():
             local_conn.close()
-        if 'remote_conn' in locals():
+        if 'remote_rds_conn' in locals():
             remote_rds_conn.close()
-            
-            
+
+
 def sync_data():
     try:
         # Attempt to connect to local and remote databases
         local_conn = psycopg2.connect(LOCAL_DB)
         remote_conn = psycopg2.connect(REMOTE_DB)
-        
-        local_cur = local_conn.cursor()
-        remote_rds_cur = remote_conn.cursor()
 
         print("Connected to both local and remote databases")
 
-        # Fetch the last run time from the local metadata table
-        local_cur.execute("SELECT last_run FROM aqi_data.sync_metadata ORDER BY id DESC LIMIT 1")
-        last_sync_time = local_cur.fetchone()
-        last_sync_time = last_sync_time[0] if last_sync_time else datetime.min
-
-        print(f"Last sync timestamp: {last_sync_time}")
-
-        # Sync data from aqi_readings table
-        local_cur.execute("""
-            SELECT timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi 
-            FROM aqi_data.aqi_readings WHERE timestamp > %s
-        """, (last_sync_time,))
-        new_aqi_rows = local_cur.fetchall()
-
-        # Insert new rows into the remote aqi_readings table
-        CHUNK_SIZE = 100
-        if new_aqi_rows:
-            print(f"Found {len(new_aqi_rows)} new rows to sync in aqi_readings")
-
-            for i in range(0, len(new_aqi_rows), CHUNK_SIZE):
-                chunk = new_aqi_rows[i:i + CHUNK_SIZE]
-                remote_rds_cur.executemany("""
-                    INSERT INTO aqi_data.aqi_readings (timestamp, pm25, pm10, aqi_pm25, aqi_pm10, overall_aqi)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (timestamp) DO NOTHING
-                """, chunk)
-                remote_conn.commit()
-                print(f"Inserted chunk {i // CHUNK_SIZE + 1} with {len(chunk)} rows into aqi_readings")
-
-        # Sync data from zphs01b_readings table
-        local_cur.execute("""
-            SELECT timestamp, pm1_0, pm2_5, pm10, co2, voc, temperature, humidity, 
-                   ch2o, co, o3, no2, aqi_pm2_5, aqi_pm10, aqi_co, aqi_o3, aqi_no2, overall_aqi
-            FROM aqi_data.zphs01b_readings WHERE timestamp > %s
-        """, (last_sync_time,))
-        new_zphs01b_rows = local_cur.fetchall()
-
-        if new_zphs01b_rows:
-            print(f"Found {len(new_zphs01b_rows)} new rows to sync in zphs01b_readings")
-
-            for i in range(0, len(new_zphs01b_rows), CHUNK_SIZE):
-                chunk = new_zphs01b_rows[i:i + CHUNK_SIZE]
-                remote_rds_cur.executemany("""
-                    INSERT INTO aqi_data.zphs01b_readings (
-                        timestamp, pm1_0, pm2_5, pm10, co2, voc, temperature, humidity, 
-                        ch2o, co, o3, no2, aqi_pm2_5, aqi_pm10, aqi_co, aqi_o3, aqi_no2, overall_aqi
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (timestamp) DO NOTHING
-                """, chunk)
-                remote_conn.commit()
-                print(f"Inserted chunk {i // CHUNK_SIZE + 1} with {len(chunk)} rows into zphs01b_readings")
+        for table in ("aqi_readings", "zphs01b_readings"):
+            sync_table(local_conn, remote_conn, "remote", table)
 
-        # Update the sync metadata table with the current time after a successful sync
+        # Record the run; the sync position itself is kept in sync_progress
+        local_cur = local_conn.cursor()
         local_cur.execute("INSERT INTO aqi_data.sync_metadata (last_run) VALUES (NOW() + INTERVAL '5 hours 30 minutes')")
         local_conn.commit()
         print("Sync metadata updated with new timestamp.")
@@ -217,8 +167,6 @@ def sync_data():
         # Close connections if they were successfully created
         if 'local_cur' in locals():
             local_cur.close()
-        if 'remote_cur' in locals():
-            remote_rds_cur.close()
         if 'local_conn' in locals():
             local_conn.close()
         if 'remote_conn' in locals():
@@ -319,6 +267,7 @@ def sync_request_logs_and_tracking_events():
             remote_rds_conn.close()
 
 if __name__ == "__main__":
+    migrate_remote_rds()
     while True:
         sync_data_rds()
         # sync_data()